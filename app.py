@@ -50,18 +50,39 @@ The improvements I am going to make:
         - Practicing pronounciation
         - Summarizing news articles using the level of their language ability (I like this idea)
 """
+import atexit
+import csv
+import hmac
+import io
+import json
+import logging
+import mmap
 import os
-from datetime import date
-from enum import Enum
-from random import choice, shuffle
-
-import openai
-import supabase
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta, timezone
+from difflib import get_close_matches
+from enum import Enum, IntEnum
+from functools import lru_cache
+from itertools import chain, count
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from random import random, shuffle, uniform
+from threading import BoundedSemaphore, Lock, Timer
+
+import click
 from dotenv import load_dotenv
-from flask import Flask, request
-from supabase import Client as SupabaseClient
-from supabase import create_client
-from twilio.rest import Client as TwilioClient
+from flask import Flask, Response, abort, g, has_app_context, jsonify, request, stream_with_context
 from twilio.twiml.messaging_response import MessagingResponse
 
 """
@@ -81,28 +102,178 @@ auth_token = os.getenv("AUTHTOKEN")
 # load ChatGPT credentials
 chatgpt_key = os.getenv("CHATGPT")
 
+# load generated content cache settings
+cache_path = os.getenv("CACHE_PATH", "teleglot_cache.sqlite3")
+learn_cache_ttl_seconds = int(os.getenv("LEARN_CACHE_TTL_SECONDS", 30 * 24 * 60 * 60))
+learn_cache_memory_size = int(os.getenv("LEARN_CACHE_MEMORY_SIZE", 1024))
+learn_cache_disk_size = int(os.getenv("LEARN_CACHE_DISK_SIZE", 50000))
+article_cache_ttl_seconds = int(os.getenv("ARTICLE_CACHE_TTL_SECONDS", 2 * 24 * 60 * 60))
+article_cache_memory_size = int(os.getenv("ARTICLE_CACHE_MEMORY_SIZE", 256))
+article_cache_disk_size = int(os.getenv("ARTICLE_CACHE_DISK_SIZE", 5000))
+
+# load offline lexicon settings
+lexicon_path = os.getenv("LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lexicon.tsv"))
+lexicon_neighbours = int(os.getenv("LEXICON_NEIGHBOURS", 12))
+
+# load async webhook settings
+async_webhooks = os.getenv("ASYNC_WEBHOOKS", "false").lower() == "true"
+webhook_workers = int(os.getenv("WEBHOOK_WORKERS", 8))
+webhook_queue_size = int(os.getenv("WEBHOOK_QUEUE_SIZE", 100))
+webhook_user_backlog = int(os.getenv("WEBHOOK_USER_BACKLOG", 20))
+
+# load reply delivery settings
+whatsapp_message_limit = 1600
+stream_replies = os.getenv("STREAM_REPLIES", "true").lower() == "true"
+stream_min_chunk_chars = int(os.getenv("STREAM_MIN_CHUNK_CHARS", 160))
+
+# load logging and tracing settings
+log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+trace_sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", 0.1))
+trace_path = os.getenv("TRACE_PATH", "teleglot_traces.jsonl")
+trace_max_bytes = int(os.getenv("TRACE_MAX_BYTES", 50 * 1024 * 1024))
+
+# ChatGPT prices in USD per 1K (prompt, completion) tokens, used for cost telemetry
+openai_prices = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+# load ChatGPT gateway settings (deadlines are per command, in seconds)
+llm_default_deadline_seconds = float(os.getenv("LLM_DEADLINE_SECONDS", 15))
+llm_deadline_seconds = {
+    command: float(os.getenv(f"LLM_DEADLINE_SECONDS_{command.upper()}", default))
+    for command, default in (("learn", 10), ("learn_batch", 60), ("suggest", 10), ("quiz", 10), ("article", 30))
+}
+llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", 2))
+llm_retry_base_seconds = float(os.getenv("LLM_RETRY_BASE_SECONDS", 0.25))
+llm_breaker_failures = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+llm_breaker_reset_seconds = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+llm_hedge = os.getenv("LLM_HEDGE", "false").lower() == "true"
+llm_hedge_min_seconds = float(os.getenv("LLM_HEDGE_MIN_SECONDS", 1))
+
+# load ChatGPT concurrency settings
+prompt_workers = int(os.getenv("PROMPT_WORKERS", 16))
+
+# load quiz pool settings
+quiz_pool_size = int(os.getenv("QUIZ_POOL_SIZE", 5))
+quiz_pool_low_water = int(os.getenv("QUIZ_POOL_LOW_WATER", 2))
+background_workers = int(os.getenv("BACKGROUND_WORKERS", 4))
+background_queue_size = int(os.getenv("BACKGROUND_QUEUE_SIZE", 1000))
+
+# load backend connection pool and concurrency settings
+supabase_max_connections = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 50))
+openai_max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", 50))
+twilio_max_connections = int(os.getenv("TWILIO_MAX_CONNECTIONS", 20))
+
+# load rate limiting settings
+user_command_rate_per_minute = float(os.getenv("USER_COMMAND_RATE_PER_MINUTE", 10))
+user_command_burst = int(os.getenv("USER_COMMAND_BURST", 10))
+global_command_rate_per_second = float(os.getenv("GLOBAL_COMMAND_RATE_PER_SECOND", 20))
+global_command_burst = int(os.getenv("GLOBAL_COMMAND_BURST", 50))
+rate_limited_users = int(os.getenv("RATE_LIMITED_USERS", 100000))
+message_sid_ttl_seconds = int(os.getenv("MESSAGE_SID_TTL_SECONDS", 24 * 60 * 60))
+message_sid_max_size = int(os.getenv("MESSAGE_SID_MAX_SIZE", 100000))
+
+# load conversation session settings
+session_store_size = int(os.getenv("SESSION_STORE_SIZE", 10000))
+# Sessions are per process, so they are off by default: with several workers a
+# user's next message can land on a process holding an old copy of their row
+session_ttl_seconds = int(os.getenv("SESSION_TTL_SECONDS", 0))
+
+# load broadcast settings
+broadcast_from_number = os.getenv("BROADCAST_FROM_NUMBER")
+broadcast_workers = int(os.getenv("BROADCAST_WORKERS", 16))
+broadcast_rate_per_second = float(os.getenv("BROADCAST_RATE_PER_SECOND", 20))
+broadcast_burst = int(os.getenv("BROADCAST_BURST", 20))
+broadcast_page_size = int(os.getenv("BROADCAST_PAGE_SIZE", 1000))
+broadcast_checkpoint_every = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", 100))
+
+# load vocab import/export settings
+vocab_api_token = os.getenv("VOCAB_API_TOKEN")
+vocab_import_batch_size = int(os.getenv("VOCAB_IMPORT_BATCH_SIZE", 500))
+vocab_import_max_words = int(os.getenv("VOCAB_IMPORT_MAX_WORDS", 10000))
+vocab_export_page_size = int(os.getenv("VOCAB_EXPORT_PAGE_SIZE", 1000))
+learn_card_batch_size = int(os.getenv("LEARN_CARD_BATCH_SIZE", 20))
+
+# load learn batching settings
+learn_batch_window_ms = int(os.getenv("LEARN_BATCH_WINDOW_MS", 0))
+learn_batch_max_words = int(os.getenv("LEARN_BATCH_MAX_WORDS", 10))
+learn_batch_seconds_per_word = float(os.getenv("LEARN_BATCH_SECONDS_PER_WORD", 2))
+
+# load suggest settings
+vocab_summary_users = int(os.getenv("VOCAB_SUMMARY_USERS", 10000))
+vocab_summary_ttl_seconds = int(os.getenv("VOCAB_SUMMARY_TTL_SECONDS", 60 * 60))
+suggest_prompt_excluded_words = int(os.getenv("SUGGEST_PROMPT_EXCLUDED_WORDS", 30))
+suggest_candidate_words = int(os.getenv("SUGGEST_CANDIDATE_WORDS", 6))
+vocab_duplicate_similarity = float(os.getenv("VOCAB_DUPLICATE_SIMILARITY", 0.85))
+
 # load Supabase credentials
 url: str = os.environ.get("SUPABASE_PROJECT_URL")
 supabase_key: str = os.environ.get("SUPABASE_PUBLIC_ANON_KEY")
-supabase: SupabaseClient = create_client(url, supabase_key)
 
 """
 INITIALIZATIONS
 """
-# initialize twilio
-try:
-    twilio_client = TwilioClient(account_sid, auth_token)
-except Exception as e:
-    print("An error occurred while initializing the Twilio client:", e)
-
-# initialize supabase
-try:
-    client = SupabaseClient(url, supabase_key)
-except Exception as e:
-    print("Supabase initialization error:", e)
-
-# initialize openai
-openai.api_key = chatgpt_key
+# Each backend gets one keep-alive connection pool shared by every thread, and
+# a semaphore so a slow backend can't tie up more threads than it has connections
+backend_limits = {
+    "supabase": BoundedSemaphore(supabase_max_connections),
+    "openai": BoundedSemaphore(openai_max_connections),
+    "twilio": BoundedSemaphore(twilio_max_connections),
+}
+
+# The Supabase, OpenAI and Twilio SDKs take most of the app's startup time, so
+# each is imported and its client built the first time something needs it
+backend_clients = {}
+backend_client_locks = {name: Lock() for name in backend_limits}
+
+def backend_client(name, create):
+    """The shared client for backend `name`, built with `create()` on first use."""
+    client = backend_clients.get(name)
+    if client is None:
+        with backend_client_locks[name]:
+            client = backend_clients.get(name)
+            if client is None:
+                client = backend_clients[name] = create()
+    return client
+
+def get_supabase():
+    return backend_client("supabase", create_supabase)
+
+def get_openai():
+    return backend_client("openai", create_openai)
+
+def get_twilio_client():
+    return backend_client("twilio", create_twilio_client)
+
+def pooled_session(max_connections):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max_connections))
+    return session
+
+def create_supabase():
+    import httpx
+    from supabase import ClientOptions, create_client
+
+    http_client = httpx.Client(limits=httpx.Limits(max_connections=supabase_max_connections, max_keepalive_connections=supabase_max_connections))
+    return create_client(url, supabase_key, options=ClientOptions(httpx_client=http_client))
+
+def create_openai():
+    import openai
+
+    openai.api_key = chatgpt_key
+    openai.requestssession = pooled_session(openai_max_connections)
+    return openai
+
+def create_twilio_client():
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client as TwilioClient
+
+    http_client = TwilioHttpClient(pool_connections=True)
+    http_client.session = pooled_session(twilio_max_connections)
+    return TwilioClient(account_sid, auth_token, http_client=http_client)
 
 """
 CLASS DEFINITIONS
@@ -116,16 +287,1084 @@ class Basic_Info_Stage(Enum):
     NO_INTERESTS = 6
     COMPLETED = 7
 
+
+class ConversationState(IntEnum):
+    ONBOARDING = 0
+    MENU = 1
+    QUIZ = 2
+
+
+class Session:
+    """
+    A user's row and where they are in the conversation.
+
+    `user` is the row returned by get_user; update_user writes through to
+    Supabase and updates it in place, so the session never needs reloading.
+    """
+
+    __slots__ = ("user", "state", "expires_at")
+
+    def __init__(self, user, ttl_seconds):
+        self.user = user
+        self.expires_at = time.time() + ttl_seconds
+        self.refresh()
+
+    def refresh(self):
+        """Recompute the state from the row after a handler has changed it."""
+        if (phone_number_has_completed_basic_info(self.user) != Basic_Info_Stage.COMPLETED.name):
+            self.state = ConversationState.ONBOARDING
+        elif (self.user.data["is_in_quiz_mode"]):
+            self.state = ConversationState.QUIZ
+        else:
+            self.state = ConversationState.MENU
+
+
+class SessionStore:
+    """
+    Bounded, least recently used store of Sessions keyed by phone number.
+
+    Sessions expire after `ttl_seconds` so a row changed by another process
+    (or directly in Supabase) is picked up again. With a TTL of 0 nothing is
+    stored and every message loads the user's row.
+    """
+
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.sessions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, phone_number):
+        with self.lock:
+            session = self.sessions.get(phone_number)
+            if session is not None and session.expires_at > time.time():
+                self.sessions.move_to_end(phone_number)
+                self.hits += 1
+                return session
+            self.sessions.pop(phone_number, None)
+            self.misses += 1
+        return None
+
+    def put(self, phone_number, session):
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        with self.lock:
+            self.sessions[phone_number] = session
+            self.sessions.move_to_end(phone_number)
+            while len(self.sessions) > self.max_size:
+                self.sessions.popitem(last=False)
+
+    def forget(self, phone_number):
+        with self.lock:
+            self.sessions.pop(phone_number, None)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "sessions": len(self.sessions)}
+
+
+class TieredCache:
+    """
+    Two-tier cache for generated ChatGPT content.
+
+    Entries live in an in-process LRU and in a SQLite file shared by every
+    worker on the host. Both tiers expire entries after `ttl_seconds` and
+    evict the least recently used entries once they grow past their size.
+    A disk entry's `last_used` is only rewritten once per
+    `touch_interval_seconds`, so reads rarely write. SQLite errors, such as
+    another worker holding the lock too long, are logged and count as misses.
+    """
+
+    touch_interval_seconds = 60
+
+    def __init__(self, namespace, path, ttl_seconds, memory_size, disk_size):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory = OrderedDict()
+        self.lock = Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.errors = 0
+
+        # WAL lets workers read while another writes; writers wait up to 5 seconds for the lock
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value TEXT, expires_at REAL, last_used REAL, PRIMARY KEY (namespace, key))")
+        self.db.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (namespace, last_used)")
+        self.db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            # In-process tier
+            entry = self.memory.get(key)
+            if entry is not None and entry[1] > now:
+                self.memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return entry[0]
+            self.memory.pop(key, None)
+
+            # SQLite tier
+            try:
+                row = self.db.execute("SELECT value, expires_at, last_used FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)).fetchone()
+                if row is not None and row[1] > now:
+                    if now - row[2] > self.touch_interval_seconds:
+                        self.db.execute("UPDATE cache SET last_used = ? WHERE namespace = ? AND key = ?", (now, self.namespace, key))
+                        self.db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.hits["disk"] += 1
+                    return row[0]
+                if row is not None:
+                    self.db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                    self.db.commit()
+            except sqlite3.Error as e:
+                self._disk_error("read", e)
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self.lock:
+            self._remember(key, value, expires_at)
+            try:
+                self.db.execute("INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, last_used) VALUES (?, ?, ?, ?, ?)", (self.namespace, key, value, expires_at, now))
+                # Drop expired entries and anything past the size bound
+                self.db.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, now))
+                self.db.execute("DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE namespace = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.namespace, self.disk_size))
+                self.db.commit()
+            except sqlite3.Error as e:
+                self._disk_error("write", e)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+            return {
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_errors": self.errors,
+            }
+
+    def _disk_error(self, operation, e):
+        """Log a SQLite failure and roll back its transaction. Called with the lock held."""
+        self.errors += 1
+        logger.warning("Cache %s error (%s): %s", operation, self.namespace, e)
+        try:
+            self.db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key, value, expires_at):
+        self.memory[key] = (value, expires_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+class BoundedWorkerPool:
+    """
+    Thread pool for work that happens after the webhook has been acknowledged.
+
+    At most `workers + queue_size` jobs are accepted at once; `submit` returns
+    False instead of queueing without bound so callers can shed load.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="teleglot-worker")
+        self.slots = BoundedSemaphore(workers + queue_size)
+        self.lock = Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=1000)
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            return False
+        with self.lock:
+            self.queued += 1
+        self.executor.submit(self._run, fn, args, time.perf_counter())
+        return True
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            return {
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "latency_p50_seconds": percentile(latencies, 50),
+                "latency_p95_seconds": percentile(latencies, 95),
+                "latency_max_seconds": max(latencies, default=0.0),
+            }
+
+    def _run(self, fn, args, submitted_at):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        failed = False
+        try:
+            fn(*args)
+        except Exception as e:
+            failed = True
+            logger.error("Background job error: %s", e)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+                self.failed += failed
+                self.latencies.append(time.perf_counter() - submitted_at)
+            self.slots.release()
+
+class KeyedSerialQueue:
+    """
+    Runs jobs with the same key one at a time, in the order they were submitted.
+
+    Each key's jobs wait in their own deque, and only one job per key drains
+    it on `pool`, so different keys still run in parallel. `submit` returns
+    False when the key already has `max_pending` jobs waiting or the pool is
+    full. Queue depth and latency are tracked per job rather than per drain,
+    from submission to completion.
+    """
+
+    def __init__(self, pool, max_pending):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.lock = Lock()
+        self.pending = {}
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=1000)
+
+    def submit(self, key, fn, *args):
+        job = (fn, args, time.perf_counter())
+        with self.lock:
+            queue = self.pending.get(key)
+            if queue is not None:
+                if len(queue) >= self.max_pending:
+                    self.rejected += 1
+                    return False
+                queue.append(job)
+                return True
+            if not self.pool.submit(self._drain, key):
+                self.rejected += 1
+                return False
+            self.pending[key] = deque([job])
+            return True
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            return {
+                "queue_depth": sum(len(queue) for queue in self.pending.values()),
+                "active_keys": len(self.pending),
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "latency_p50_seconds": percentile(latencies, 50),
+                "latency_p95_seconds": percentile(latencies, 95),
+                "latency_max_seconds": max(latencies, default=0.0),
+            }
+
+    def _drain(self, key):
+        while True:
+            with self.lock:
+                queue = self.pending[key]
+                if not queue:
+                    del self.pending[key]
+                    return
+                fn, args, submitted_at = queue.popleft()
+                self.running += 1
+            failed = False
+            try:
+                fn(*args)
+            except Exception as e:
+                failed = True
+                logger.error("Background job error: %s", e)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.failed += failed
+                    self.latencies.append(time.perf_counter() - submitted_at)
+
+class LLMUnavailableError(Exception):
+    """Raised by the ChatGPT gateway when it fails fast instead of calling OpenAI."""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing backend.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    `allow` returns False for `reset_seconds`. After that, a single trial
+    call is let through (half open); its result closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.lock = Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.trial_in_flight:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def stats(self):
+        with self.lock:
+            if self.opened_at is None:
+                state = "closed"
+            elif self.trial_in_flight or time.monotonic() - self.opened_at >= self.reset_seconds:
+                state = "half_open"
+            else:
+                state = "open"
+            return {"state": state, "consecutive_failures": self.failures}
+
+
+class LLMMetrics:
+    """
+    Per-command telemetry for ChatGPT calls.
+
+    Every call records its wall time, token usage, estimated cost and error
+    class (if any) and is also written to the `teleglot.llm` logger as one
+    JSON line. Cache hits and misses in front of ChatGPT are counted too,
+    so the hit rate of each command can be read next to its cost.
+    """
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.lock = Lock()
+        self.commands = {}
+
+    def record_call(self, command, model, seconds, prompt_tokens=0, completion_tokens=0, first_token_seconds=None, error=None):
+        price = self.prices.get(model, (0.0, 0.0))
+        cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000
+        error_class = type(error).__name__ if error is not None else None
+        with self.lock:
+            stats = self._stats_for(command)
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost_usd"] += cost
+            stats["latencies"].append(seconds)
+            if error_class is not None:
+                stats["errors"][error_class] = stats["errors"].get(error_class, 0) + 1
+
+        llm_logger.info(json.dumps({
+            "event": "llm_call",
+            "command": command,
+            "model": model,
+            "seconds": round(seconds, 4),
+            "first_token_seconds": None if first_token_seconds is None else round(first_token_seconds, 4),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": round(cost, 6),
+            "error": error_class,
+        }))
+
+    def record_cache(self, command, hit):
+        with self.lock:
+            self._stats_for(command)["cache_hits" if hit else "cache_misses"] += 1
+
+    def record_retry(self, command):
+        with self.lock:
+            self._stats_for(command)["retries"] += 1
+
+    def record_hedge(self, command):
+        with self.lock:
+            self._stats_for(command)["hedges"] += 1
+
+    def latency_percentile(self, command, pct):
+        with self.lock:
+            return percentile(self._stats_for(command)["latencies"], pct)
+
+    def stats(self):
+        with self.lock:
+            return {
+                command: {
+                    **{key: value for key, value in stats.items() if key not in ("latencies", "errors")},
+                    "errors": dict(stats["errors"]),
+                    "latency_p50_seconds": percentile(stats["latencies"], 50),
+                    "latency_p95_seconds": percentile(stats["latencies"], 95),
+                    "latency_p99_seconds": percentile(stats["latencies"], 99),
+                }
+                for command, stats in self.commands.items()
+            }
+
+    def _stats_for(self, command):
+        if command not in self.commands:
+            self.commands[command] = {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+                "cache_hits": 0, "cache_misses": 0, "retries": 0, "hedges": 0, "errors": {}, "latencies": deque(maxlen=1000),
+            }
+        return self.commands[command]
+
+class TokenBucket:
+    """Allows `rate` events per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def refund(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def acquire(self):
+        """Block until a token is available."""
+        while not self.try_acquire():
+            time.sleep(1 / self.rate)
+
+
+class RateLimiter:
+    """
+    A TokenBucket per key (phone number) plus one global bucket.
+
+    `allow` returns None when the event may go ahead, otherwise "user" or
+    "global" depending on which limit was hit. Only the `max_keys` most
+    recently seen keys keep a bucket.
+    """
+
+    def __init__(self, rate, burst, global_rate, global_burst, max_keys):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.lock = Lock()
+        self.limited = {"user": 0, "global": 0}
+
+    def allow(self, key):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+                while len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            self.buckets.move_to_end(key)
+
+        limit = None
+        if not bucket.try_acquire():
+            limit = "user"
+        elif not self.global_bucket.try_acquire():
+            bucket.refund()
+            limit = "global"
+        if limit is not None:
+            with self.lock:
+                self.limited[limit] += 1
+        return limit
+
+    def stats(self):
+        with self.lock:
+            return {"limited_user": self.limited["user"], "limited_global": self.limited["global"], "tracked_keys": len(self.buckets)}
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers that arrive while it runs share its result."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self.calls), "coalesced": self.coalesced}
+
+
+class RequestBatcher:
+    """
+    Answers keys submitted within `window_seconds` of each other with one call.
+
+    The first key starts the window; the batch is sent when the window closes
+    or `max_size` keys are waiting, whichever is first. `fn(keys)` returns
+    {key: result}, and each caller's Future gets its key's result, a KeyError
+    if `fn` left it out, or the exception `fn` raised. Callers submitting a key
+    that is already waiting share its Future. Once sent, each Future's
+    `batch_size` is the number of keys that went with it.
+    """
+
+    def __init__(self, fn, window_seconds, max_size):
+        self.fn = fn
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self.lock = Lock()
+        self.pending = {}
+        self.timer = None
+        self.batches = 0
+        self.keys = 0
+        self.coalesced = 0
+
+    def submit(self, key):
+        batch = None
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self.pending[key] = Future()
+            if len(self.pending) >= self.max_size:
+                batch = self.take()
+            elif self.timer is None:
+                self.timer = Timer(self.window_seconds, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if batch:
+            self.run(batch)
+        return future
+
+    def flush(self):
+        with self.lock:
+            batch = self.take()
+        if batch:
+            self.run(batch)
+
+    def take(self):
+        """Remove and return the waiting keys. Called with the lock held."""
+        batch, self.pending = self.pending, {}
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if batch:
+            self.batches += 1
+            self.keys += len(batch)
+        return batch
+
+    def run(self, batch):
+        for future in batch.values():
+            future.batch_size = len(batch)
+        try:
+            results = self.fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for key, future in batch.items():
+            if key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(KeyError(key))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "waiting": len(self.pending),
+                "batches": self.batches,
+                "avg_batch_size": round(self.keys / self.batches, 2) if self.batches else 0,
+                "coalesced": self.coalesced,
+            }
+
+
+class RecentKeys:
+    """Remembers keys for `ttl_seconds` (up to `max_size` of them) to spot duplicates."""
+
+    def __init__(self, ttl_seconds, max_size):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.keys = OrderedDict()
+        self.lock = Lock()
+        self.duplicates = 0
+
+    def add(self, key):
+        """Remember `key`; returns False if it was already seen recently."""
+        now = time.monotonic()
+        with self.lock:
+            while self.keys and (len(self.keys) >= self.max_size or next(iter(self.keys.values())) <= now):
+                self.keys.popitem(last=False)
+            if key in self.keys:
+                self.duplicates += 1
+                return False
+            self.keys[key] = now + self.ttl_seconds
+            return True
+
+    def discard(self, key):
+        """Forget `key`, so it is accepted again."""
+        with self.lock:
+            self.keys.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"duplicates": self.duplicates, "tracked_keys": len(self.keys)}
+
+
+class VocabIndex:
+    """
+    Finds words that are another form or spelling of words already added.
+
+    Words are keyed by vocab_key, so "run", "running" and "to run", or
+    "colour" and "color", match exactly. Each key is also a row of a NumPy
+    matrix holding unit vectors of hashed character trigrams, which catches
+    misspellings like "accomodation". A row only matches when its cosine
+    similarity is at least `threshold` and its key is within
+    `length_slack` characters of the word's, since a shorter word inside a
+    longer one ("friend" in "friendship") also scores highly. The matrix
+    doubles in size as it fills. Without NumPy only keys are compared.
+    """
+
+    length_slack = 2
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.keys = {}
+        self.words = []
+        self.vectors = None
+        self.lengths = None
+
+    def add(self, word):
+        key = vocab_key(word)
+        if key in self.keys:
+            return
+        self.keys[key] = word
+        vector = trigram_vector(key)
+        if vector is None:
+            return
+        size = len(self.words)
+        if self.vectors is None or size == len(self.vectors):
+            numpy = load_numpy()
+            vectors = numpy.zeros((max(16, size * 2), trigram_dimensions), dtype="float32")
+            lengths = numpy.zeros(len(vectors), dtype="int32")
+            if size:
+                vectors[:size] = self.vectors
+                lengths[:size] = self.lengths
+            self.vectors, self.lengths = vectors, lengths
+        self.vectors[size] = vector
+        self.lengths[size] = len(key)
+        self.words.append(word)
+
+    def match(self, word):
+        """The added word that `word` duplicates, or None."""
+        key = vocab_key(word)
+        if key in self.keys:
+            return self.keys[key]
+        if not self.words:
+            return None
+        size = len(self.words)
+        scores = self.vectors[:size] @ trigram_vector(key)
+        scores[abs(self.lengths[:size] - len(key)) > self.length_slack] = 0
+        best = int(scores.argmax())
+        return self.words[best] if scores[best] >= self.threshold else None
+
+
+class VocabSummary:
+    """
+    Every word a user has learned or been suggested, kept in memory.
+
+    `words` is the full set used to filter ChatGPT's suggestions locally, and
+    `index` catches other forms of those words; `recent` is a bounded window
+    of the latest words, which is all that goes into the suggest prompt. All
+    are updated as words are saved, so the summary is only read from Supabase
+    once per `ttl_seconds`.
+    """
+
+    def __init__(self, words, recent_size, ttl_seconds):
+        self.words = set()
+        self.index = VocabIndex(vocab_duplicate_similarity)
+        self.recent = deque(maxlen=recent_size)
+        self.expires_at = time.time() + ttl_seconds
+        self.lock = Lock()
+        self.add(words)
+
+    def __contains__(self, word):
+        return normalize_vocab(word) in self.words
+
+    def add(self, words):
+        with self.lock:
+            for word in words:
+                word = normalize_vocab(word)
+                if word and word not in self.words:
+                    self.words.add(word)
+                    self.index.add(word)
+                    self.recent.append(word)
+
+    def near_duplicate(self, word):
+        """The word the user already has that `word` is a form or spelling of, or None."""
+        word = normalize_vocab(word)
+        with self.lock:
+            if word in self.words:
+                return word
+            return self.index.match(word)
+
+    def recent_words(self):
+        with self.lock:
+            return list(self.recent)
+
+    def is_expired(self):
+        return time.time() > self.expires_at
+
+
+class Lexicon:
+    """
+    Bundled English to Spanish dictionary for common words.
+
+    The file is tab separated (english, spanish, pronunciation, example_es,
+    example_en) and sorted by english in byte order. It is memory-mapped on
+    first use and only an array of line offsets is kept in memory, so a
+    lookup is a binary search over the mapped file.
+    """
+
+    fields = ("english", "spanish", "pronunciation", "example_es", "example_en")
+
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.offsets = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def _load(self):
+        with self.lock:
+            if self.offsets is not None:
+                return
+            offsets = array("Q")
+            try:
+                with open(self.path, "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                logger.warning("Lexicon unavailable, every lookup will go to ChatGPT: %s", e)
+                self.offsets = offsets
+                return
+            start = 0
+            while start < len(data):
+                end = data.find(b"\n", start)
+                if end == -1:
+                    end = len(data)
+                if end > start and data[start:start + 1] != b"#":
+                    offsets.append(start)
+                start = end + 1
+            self.data = data
+            self.offsets = offsets
+
+    def _line(self, index):
+        start = self.offsets[index]
+        end = self.data.find(b"\n", start)
+        return self.data[start:end if end != -1 else len(self.data)]
+
+    def _headword(self, index):
+        return self._line(index).split(b"\t", 1)[0]
+
+    def _find(self, key):
+        """Index of the first headword >= key (the insertion point if key isn't there)."""
+        lo, hi = 0, len(self.offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._headword(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, wop):
+        """The entry for `wop` as a dict, or None. Plurals fall back to their singular (see singularize)."""
+        if self.offsets is None:
+            self._load()
+        word = normalize_vocab(wop)
+        candidates = [word]
+        if singularize(word) != word:
+            candidates.append(singularize(word))
+        for candidate in candidates:
+            key = candidate.encode("utf-8")
+            index = self._find(key)
+            if index < len(self.offsets):
+                line = self._line(index)
+                if line.split(b"\t", 1)[0] == key:
+                    self.hits += 1
+                    return dict(zip(self.fields, line.decode("utf-8").split("\t")))
+        self.misses += 1
+        return None
+
+    def similar_words(self, wop, number_of_words=3):
+        """Headwords spelled most like `wop`, picked from its neighbours in the sorted index, other than `wop` or its singular."""
+        if self.offsets is None:
+            self._load()
+        word = normalize_vocab(wop)
+        excluded = {word, singularize(word)}
+        index = self._find(word.encode("utf-8"))
+        lo = max(0, index - lexicon_neighbours)
+        hi = min(len(self.offsets), index + lexicon_neighbours + 1)
+        neighbours = [self._headword(i).decode("utf-8") for i in range(lo, hi)]
+        neighbours = [neighbour for neighbour in neighbours if neighbour not in excluded]
+        return get_close_matches(word, neighbours, n=number_of_words, cutoff=0)
+
+    def stats(self):
+        return {"entries": len(self.offsets or ()), "hits": self.hits, "misses": self.misses}
+
+
+class Span:
+    """One timed operation in a message's trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "started_at", "start_time")
+
+    def __init__(self, trace_id, span_id, parent_id, name, attributes):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_time = time.time()
+        self.started_at = time.perf_counter()
+
+
+class Tracer:
+    """
+    Records a tree of spans for each sampled message.
+
+    A trace starts with a root span (given a trace_id, normally the
+    MessageSid) and is kept for `sample_rate` of messages. Spans opened while
+    another is current become its children. Outside a sampled trace, span()
+    records nothing, so instrumented code costs next to nothing. Finished
+    spans are written to `logger` as JSON lines.
+    """
+
+    def __init__(self, sample_rate, logger):
+        self.sample_rate = sample_rate
+        self.logger = logger
+        self.current = ContextVar("teleglot_span", default=None)
+        self.span_ids = count(1)
+
+    @contextmanager
+    def span(self, name, trace_id=None, parent=None, **attributes):
+        if parent is None:
+            parent = self.current.get()
+        if (trace_id is None and parent is None) or (trace_id is not None and random() >= self.sample_rate):
+            yield None
+            return
+
+        span = Span(trace_id or parent.trace_id, f"{os.getpid():x}.{next(self.span_ids):x}", parent.span_id if parent else None, name, attributes)
+        token = self.current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self.current.reset(token)
+            self.export(span, time.perf_counter() - span.started_at)
+
+    def annotate(self, **attributes):
+        """Add attributes to the current span, if there is one."""
+        span = self.current.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def export(self, span, seconds):
+        self.logger.info(json.dumps({
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start": round(span.start_time, 6),
+            "duration_ms": round(seconds * 1000, 3),
+            **span.attributes,
+        }))
+
+"""
+SHARED RESOURCES
+"""
+# Messages are processed here when ASYNC_WEBHOOKS is on
+webhook_pool = BoundedWorkerPool(webhook_workers, webhook_queue_size)
+
+# A user's messages are processed one at a time and in order, so a quick
+# "Ann" then "Boston" during onboarding can't be answered out of order
+webhook_queues = KeyedSerialQueue(webhook_pool, webhook_user_backlog)
+
+# Work that isn't tied to a message, such as refilling quiz pools
+background_pool = BoundedWorkerPool(background_workers, background_queue_size)
+
+# Users whose quiz pool is currently being refilled
+quiz_pool_refills = set()
+quiz_pool_refills_lock = Lock()
+
+# Log records and finished spans are put on a queue by the request thread and
+# written by listener threads, so handlers never block on stderr or disk.
+# Don't log message bodies, phone numbers or user rows.
+logger = logging.getLogger("teleglot")
+trace_logger = logging.getLogger("teleglot_traces")
+if not logger.handlers:
+    log_queue = SimpleQueue()
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    log_listener = QueueListener(log_queue, log_handler)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(log_level)
+    logger.propagate = False
+
+    trace_queue = SimpleQueue()
+    trace_handler = RotatingFileHandler(trace_path, maxBytes=trace_max_bytes, backupCount=3, delay=True)
+    trace_handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_listener = QueueListener(trace_queue, trace_handler)
+    trace_logger.addHandler(QueueHandler(trace_queue))
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+    log_listener.start()
+    trace_listener.start()
+    atexit.register(trace_listener.stop)
+    atexit.register(log_listener.stop)
+
+# Spans for a sample of messages, written to TRACE_PATH
+tracer = Tracer(trace_sample_rate, trace_logger)
+
+# ChatGPT telemetry, logged as JSON lines and reported at /metrics
+llm_logger = logging.getLogger("teleglot.llm")
+llm_metrics = LLMMetrics(openai_prices)
+
+# Shared by every ChatGPT call so the whole app backs off together while OpenAI is degraded
+llm_circuit_breaker = CircuitBreaker(llm_breaker_failures, llm_breaker_reset_seconds)
+
+# Hedged requests get their own threads so they can't starve prompt_executor
+hedge_executor = ThreadPoolExecutor(max_workers=prompt_workers, thread_name_prefix="teleglot-hedge")
+
+# Limits on commands that call ChatGPT, per user and across all users
+command_rate_limiter = RateLimiter(user_command_rate_per_minute / 60, user_command_burst, global_command_rate_per_second, global_command_burst, rate_limited_users)
+
+# Identical commands from the same user that are already running share one result
+command_flights = SingleFlight()
+
+# Twilio retries a webhook with the same MessageSid; we only process it once
+seen_message_sids = RecentKeys(message_sid_ttl_seconds, message_sid_max_size)
+
+# Conversation sessions, so most messages are routed without reading the user's row
+sessions = SessionStore(session_store_size, session_ttl_seconds)
+
+# Progress of the backend warm up started by /ready
+backend_warmup = {"running": False, "ready": False, "errors": {}}
+backend_warmup_lock = Lock()
+
+# Per-user VocabSummary objects, least recently used first
+vocab_summaries = OrderedDict()
+vocab_summaries_lock = Lock()
+
+# Used to run independent ChatGPT prompts concurrently
+prompt_executor = ThreadPoolExecutor(max_workers=prompt_workers, thread_name_prefix="teleglot-prompt")
+
+# Common words are translated from the bundled lexicon before asking ChatGPT
+lexicon = Lexicon(lexicon_path)
+
+# Learn cards ChatGPT has to write for different users at about the same time share one prompt
+learn_batcher = RequestBatcher(lambda words: prompt_chatgpt_for_learn_cards(words, command="learn", deadline_seconds=learn_batch_deadline_seconds(len(words))),
+                               learn_batch_window_ms / 1000, learn_batch_max_words)
+
+# Learn cards only depend on the word, so they are shared across all users
+learn_card_cache = TieredCache("learn_cards", cache_path, learn_cache_ttl_seconds, learn_cache_memory_size, learn_cache_disk_size)
+
+# Articles are shared by users with the same proficiency, interest and region (see article_cache_key)
+article_cache = TieredCache("articles", cache_path, article_cache_ttl_seconds, article_cache_memory_size, article_cache_disk_size)
+
 """
 HELPER FUNCTIONS
 """
 def respond(message):
     """Respond to incoming calls with a simple text message."""
     response = MessagingResponse()
-    response.message(message)
+    for part in split_message(message):
+        response.message(part)
     return str(response)
 
 
+def split_message(text, limit=None):
+    """
+    Split text into WhatsApp-sized messages.
+
+    Cuts at the last paragraph break that fits, then the last sentence end,
+    then the last space, and only cuts mid-word as a last resort.
+    """
+    limit = limit or whatsapp_message_limit
+    parts = []
+    text = text.strip()
+    while len(text) > limit:
+        cut = find_message_cut(text, limit)
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+def find_message_cut(text, limit):
+    """Index at which to cut the first message off `text` (see split_message)."""
+    cut = text.rfind("\n\n", 0, limit)
+    if cut <= 0:
+        cut = max(text.rfind(end, 0, limit - 1) for end in (". ", "! ", "? ")) + 1
+    if cut <= 0:
+        cut = text.rfind(" ", 0, limit)
+    if cut <= 0:
+        cut = limit
+    return cut
+
+
 main_menu_text = "MAIN MENU:\n\n" \
                  "* To learn a word or phrase, text: 'Learn ___.'\n\n" \
                  "* To see recommendations on some new words, text 'Suggest'\n\n" \
@@ -135,86 +1374,354 @@ main_menu_text = "MAIN MENU:\n\n" \
                  "* To delete your account or start fresh, text 'Delete Account'"
 
 def main_menu():
-    return respond(main_menu_text)
+    return main_menu_text
+
+def schedule_review(ease, interval_days, repetitions, quality):
+    """
+    SM-2 spaced repetition step.
+
+    `quality` is how well the word was recalled, from 0 (blackout) to 5
+    (perfect). Returns the word's new (ease, interval_days, repetitions).
+    """
+    if quality < 3:
+        repetitions = 0
+        interval_days = 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval_days = 1
+        elif repetitions == 2:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease)
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease, interval_days, repetitions
+
+def format_lexicon_entry(entry):
+    """Lay out a lexicon entry like the learn cards ChatGPT writes."""
+    return f"Translation: {entry['spanish']}\n" \
+           f"Pronunciation: {entry['pronunciation']}\n" \
+           f"Sample sentence: {entry['example_es']} ({entry['example_en']})"
+
+def split_words(text):
+    """Split a comma or line separated list of words (e.g. a ChatGPT reply) into normalized words."""
+    return [word for word in (normalize_vocab(part) for part in re.split(r"[,\n]", text)) if word]
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples (0 when there are none)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def normalize_vocab(wop):
+    """Normalize a word or phrase so that 'Water.', ' water' and 'wáter' share one key."""
+    wop = unicodedata.normalize("NFKD", wop.casefold())
+    wop = "".join(c for c in wop if not unicodedata.combining(c))
+    return " ".join(wop.split()).strip(".!?,;: ")
+
+# Plurals the suffix rules in singularize get wrong
+irregular_plurals = {
+    "children": "child", "men": "man", "women": "woman", "people": "person", "feet": "foot",
+    "teeth": "tooth", "mice": "mouse", "geese": "goose", "leaves": "leaf", "knives": "knife",
+    "wives": "wife", "lives": "life", "buses": "bus", "potatoes": "potato", "tomatoes": "tomato",
+}
+
+# Words ending in s that aren't the plural of the word without it
+not_plurals = {
+    "news", "series", "species", "goods", "clothes", "glasses", "thanks", "means", "savings",
+    "arms", "manners", "stairs", "scissors", "pants", "jeans", "shorts", "always", "perhaps",
+    "yours", "hers", "ours", "theirs", "besides", "sometimes", "towards", "afterwards", "whereas",
+    "lens", "canvas", "atlas",
+}
+
+def singularize(wop):
+    """The singular of a plural noun, or of a phrase's last word ('ice creams' -> 'ice cream'); other text is returned as is."""
+    *rest, word = wop.split() or [""]
+    if word in irregular_plurals:
+        word = irregular_plurals[word]
+    elif len(word) <= 3 or word in not_plurals or word.endswith(("ss", "us", "is", "ics")):
+        pass
+    elif word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith(("sses", "xes", "ches", "shes", "zes")):
+        word = word[:-2]
+    elif word.endswith("s"):
+        word = word[:-1]
+    return " ".join([*rest, word])
+
+# Verb forms the suffix rules in lemmatize can't undo. Forms that are also
+# words in their own right ("left", "saw", "found", "better") are left out
+irregular_lemmas = {
+    "am": "be", "is": "be", "are": "be", "was": "be", "were": "be", "been": "be", "being": "be",
+    "has": "have", "had": "have", "having": "have", "does": "do", "did": "do", "done": "do",
+    "goes": "go", "went": "go", "gone": "go", "ran": "run", "ate": "eat", "eaten": "eat",
+    "seen": "see", "came": "come", "took": "take", "taken": "take", "gave": "give", "given": "give",
+    "made": "make", "said": "say", "got": "get", "gotten": "get", "knew": "know", "known": "know",
+    "bought": "buy", "brought": "bring", "told": "tell", "wrote": "write", "written": "write",
+    "spoken": "speak", "drank": "drink", "swam": "swim", "sang": "sing", "slept": "sleep",
+}
+
+# Words ending in -ing or -ed that aren't a form of a shorter word
+not_inflected = {
+    "morning", "evening", "building", "ceiling", "clothing", "meeting", "painting", "wedding", "pudding",
+    "during", "nothing", "something", "anything", "everything", "thing", "king", "ring", "wing", "spring",
+    "string", "swing", "interesting", "boring", "amazing", "exciting", "surprising", "tiring", "annoying",
+    "confusing", "charming", "bed", "red", "need", "seed", "feed", "speed", "hundred", "naked", "wicked",
+    "sacred", "tired", "bored", "interested", "excited",
+}
+
+# British spellings rewritten to American ones, so "colour" and "color" share a vocab_key
+american_spellings = [
+    (r"(?<=\w{3})our(?=$|ite|ed|ing|able|s$)", "or"),
+    (r"(?<=\w{3})is(e|ed|es|ing|ation)$", r"iz\1"),
+    (r"ys(e|ed|es|ing)$", r"yz\1"),
+    (r"(?<=\w{2})([tb])re(s?)$", r"\1er\2"),
+    (r"(?<=\w{3})ence$", "ense"),
+    (r"(?<=\w{2})ogue$", "og"),
+    (r"mme$", "m"),
+]
+
+def lemmatize_word(word):
+    """Undo common English inflections: 'running' -> 'run', 'baked' -> 'bake', 'cities' -> 'city'."""
+    if word in irregular_lemmas:
+        return irregular_lemmas[word]
+    if len(word) <= 3 or word in not_inflected:
+        return word
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            if len(stem) < 3 or not re.search(r"[aeiouy]", stem):
+                return word
+            if suffix == "ed" and stem.endswith("e"):
+                return stem + "e"
+            if suffix == "ed" and stem.endswith("i"):
+                return stem[:-1] + "y"
+            if stem[-1] == stem[-2] and (stem[-1] not in "aeioulsz" or (stem[-1] == "l" and len(stem) >= 6)):
+                return stem[:-1]
+            if stem.endswith(("bl", "iz", "c", "v", "dg")) or (
+                    len(re.findall(r"[aeiou]+", stem)) == 1 and re.search(r"[^aeiou][aeiou][^aeiouwxy]$", stem)):
+                return stem + "e"
+            return stem
+    return singularize(word)
+
+def lemmatize(wop):
+    """A rule-based lemma for a normalized word or phrase, dropping a leading 'to', 'a', 'an' or 'the'."""
+    words = wop.split()
+    while len(words) > 1 and words[0] in ("to", "a", "an", "the"):
+        words = words[1:]
+    return " ".join(lemmatize_word(word) for word in words)
+
+def vocab_key(wop):
+    """The lemma with American spelling and no spaces or hyphens, so 'ice-creams' and 'ice cream' match."""
+    key = lemmatize(normalize_vocab(wop))
+    for pattern, replacement in american_spellings:
+        key = re.sub(pattern, replacement, key)
+    return key.replace("-", "").replace(" ", "")
+
+@lru_cache(maxsize=None)
+def load_numpy():
+    """NumPy, imported on first use since most requests never need it; None when it isn't installed."""
+    try:
+        import numpy
+    except ImportError:
+        logger.warning("NumPy not installed, vocab duplicates are only found by vocab_key")
+        return None
+    return numpy
+
+trigram_dimensions = 512
+
+def trigram_vector(text):
+    """Unit vector of the hashed character trigrams of `text`, or None without NumPy."""
+    numpy = load_numpy()
+    if numpy is None:
+        return None
+    vector = numpy.zeros(trigram_dimensions, dtype="float32")
+    padded = f" {text} "
+    for start in range(len(padded) - 2):
+        vector[zlib.crc32(padded[start:start + 3].encode("utf-8")) % trigram_dimensions] += 1
+    return vector / numpy.linalg.norm(vector)
+
+"""
+REQUEST CONTEXT FUNCTIONS
+"""
+@app.before_request
+def reset_db_round_trips():
+    g.db_round_trips = 0
+
+@app.after_request
+def report_db_round_trips(response):
+    """Expose how many Supabase round trips the message cost so we can watch it under load."""
+    round_trips = g.get("db_round_trips", 0)
+    logger.debug("Supabase round trips for this message: %s", round_trips)
+    response.headers["X-DB-Round-Trips"] = str(round_trips)
+    return response
+
+def execute(query):
+    """Execute a Supabase query, counting the round trip against the current message."""
+    if has_app_context():
+        g.db_round_trips = g.get("db_round_trips", 0) + 1
+    with tracer.span("supabase", caller=sys._getframe(1).f_code.co_name), backend_limits["supabase"]:
+        return query.execute()
 
 """
 DATABASE FUNCTIONS
 """
 def get_user(phone_number):
+    """Load the user's row once per message; handlers receive it and keep it in sync."""
     # Check if the phone number exists in the user database
     try:
-        return supabase.table("users").select("*").eq("phone_number", phone_number).maybe_single().execute()
-    except:
-        try:
-            supabase.table("users").insert([ {"phone_number": phone_number}]).execute()
-        except Exception as ie:
-            print("Supabase insertions error (phone_number):", ie)
-        return get_user(phone_number)
+        user = execute(get_supabase().table("users").select("*").eq("phone_number", phone_number).maybe_single())
+    except Exception:
+        user = None
+    if user is not None:
+        return user
+
+    # Create the user and use the inserted row instead of selecting it again
+    try:
+        user = execute(get_supabase().table("users").insert([ {"phone_number": phone_number}]))
+        user.data = user.data[0]
+        return user
+    except Exception as ie:
+        logger.error("Supabase insertions error (phone_number): %s", ie)
+    return get_user(phone_number)
+
+
+def update_user(user, fields):
+    """Write fields to the user's row and update the request's copy of the row in place."""
+    execute(get_supabase().table("users").update(fields).eq("phone_number", user.data["phone_number"]))
+    user.data.update(fields)
 
 
 def delete_account(phone_number):
-    # delete the user's learned vocab from the database
+    # delete the user and all of their vocab and quizzes in one transaction (see migrations/002)
+    try:
+        execute(get_supabase().rpc("delete_account", { "p_phone_number": phone_number }))
+    except Exception as e:
+        logger.error("Supabase deletion error (delete_account): %s", e)
+        return "Error: Unable to delete account. Please try again later."
+
+    forget_vocab_summary(phone_number)
+    sessions.forget(phone_number)
+    return "Your account has been deleted. Text anything to start over."
+
+def get_due_vocab(phone_number, limit):
+    """The user's next `limit` words by review due date, and how many words they have in total."""
     try:
-        supabase.table("learned_vocab").delete().eq("phone_number", phone_number).execute()
+        data = execute(get_supabase().table("learned_vocab").select(
+            "wop", count="exact").eq("phone_number", phone_number).order("due_at").limit(limit))
     except Exception as e:
-        print("Supabase deletion error (learned_vocab):", e)
-        return respond("Error: Unable to delete account. Please try again later.")
+        logger.error("Supabase fetch error (due vocab): %s", e)
+        return [], 0
+    return [row["wop"] for row in data.data], data.count
 
-    # delete the user's suggested vocab from the database
+def review_vocab(phone_number, wop, answer_is_correct):
+    """Move a word's next review date based on the user's quiz answer (SM-2)."""
     try:
-        supabase.table("suggested_vocab").delete().eq("phone_number", phone_number).execute()
+        data = execute(get_supabase().table("learned_vocab").select(
+            "ease, interval_days, repetitions").eq("phone_number", phone_number).eq("wop", wop).limit(1))
+        if (not data.data):
+            return
+        row = data.data[0]
+        ease, interval_days, repetitions = schedule_review(row["ease"], row["interval_days"], row["repetitions"], 4 if answer_is_correct else 1)
+        execute(get_supabase().table("learned_vocab").update({
+            "ease": ease,
+            "interval_days": interval_days,
+            "repetitions": repetitions,
+            "due_at": (datetime.now(timezone.utc) + timedelta(days=interval_days)).isoformat(),
+        }).eq("phone_number", phone_number).eq("wop", wop))
     except Exception as e:
-        print("Supabase deletion error (suggestion_vocab):", e)
-        return respond("Error: Unable to delete account. Please try again later.")
+        logger.error("Supabase update error (vocab review): %s", e)
+
+def get_pooled_quizzes(phone_number):
+    try:
+        data = execute(get_supabase().table("quiz_pool").select(
+            "*").eq("phone_number", phone_number).order("id"))
+    except Exception as e:
+        logger.error("Supabase fetch error (quiz pool): %s", e)
+        return []
+    return data.data
+
+def pop_pooled_quiz(phone_number, wop):
+    """Take a pre-generated quiz for `wop`. Returns (quiz or None, quizzes left in the user's pool)."""
+    # The pool holds at most QUIZ_POOL_SIZE rows, so reading all of it is cheap
+    pooled = get_pooled_quizzes(phone_number)
+    quiz = next((row for row in pooled if row["wop"] == wop), None)
+    if (quiz is None):
+        return None, len(pooled)
 
-    # delete the user from the database
+    # Another message may have taken the same quiz; only use it if we deleted it
     try:
-        supabase.table("users").delete().eq("phone_number", phone_number).execute()
+        claimed = execute(get_supabase().table("quiz_pool").delete().eq("id", quiz["id"]))
     except Exception as e:
-        print("Supabase insertions error (phone_number):", e)
-        return respond("Error: Unable to delete account. Please try again later.")
+        logger.error("Supabase deletion error (quiz pool): %s", e)
+        return None, len(pooled)
+    if (not claimed.data):
+        return None, len(pooled) - 1
 
-    return respond("Your account has been deleted. Text anything to start over.")
+    return quiz, len(pooled) - 1
 
-def phone_number_vocab_pair_exists(phone_number, vocab):
+def delete_pooled_quizzes(ids):
+    if (not ids):
+        return
     try:
-        data = supabase.table("learned_vocab").select(
-            "*").eq("phone_number", phone_number).eq("wp", vocab).execute()
+        execute(get_supabase().table("quiz_pool").delete().in_("id", ids))
     except Exception as e:
-        print("Supabase insertions error (phone_number):", e)
-        return False 
-    return not len(data.data) == 0
+        logger.error("Supabase deletion error (quiz pool): %s", e)
+
+def insert_pooled_quizzes(phone_number, quizzes):
+    if (not quizzes):
+        return
+    try:
+        execute(get_supabase().table("quiz_pool").insert([
+            {"phone_number": phone_number, **quiz} for quiz in quizzes
+        ]))
+    except Exception as e:
+        logger.error("Supabase insertions error (quiz pool): %s", e)
 
 def insert_vocab(phone_number, vocab):
-    # Check if the phone number and vocab pair already exists
-    if (phone_number_vocab_pair_exists(phone_number, vocab)):
-        return False
+    """Save a learned word once per user (unique on phone_number, wop). Returns True if it was new."""
+    return len(insert_vocab_batch(phone_number, [vocab])) > 0
 
-    # Insert the vocab into the database under that phone number
+def insert_vocab_batch(phone_number, words):
+    """Save learned words in one upsert, skipping ones the user already has. Returns the new words."""
+    rows = [{"phone_number": phone_number, "wop": word} for word in dict.fromkeys(normalize_vocab(word) for word in words) if word]
+    if not rows:
+        return []
     try:
-        supabase.table("learned_vocab").insert([
-            {"phone_number": phone_number, "wop": vocab}
-        ]).execute()
+        data = execute(get_supabase().table("learned_vocab").upsert(rows, on_conflict="phone_number,wop", ignore_duplicates=True))
     except Exception as e:
-        print("Supabase insertions error (phone_number):", e)
-        return False
+        logger.error("Supabase insertions error (learned vocab): %s", e)
+        return []
+
+    add_to_vocab_summary(phone_number, [row["wop"] for row in rows])
+    return [row["wop"] for row in data.data]
 
-    return True
+def get_learned_vocab_page(phone_number, after_id, page_size):
+    """One page of the user's learned words with their review progress, in id order after `after_id`."""
+    data = execute(get_supabase().table("learned_vocab").select(
+        "id, wop, ease, interval_days, repetitions, due_at").eq("phone_number", phone_number).gt("id", after_id).order("id").limit(page_size))
+    return data.data
 
-def insert_suggested_vocab(phone_number, vocab):
+def insert_suggested_vocab(phone_number, words):
+    """Save each suggested word as its own row (unique on phone_number, suggestion)."""
+    rows = [{"phone_number": phone_number, "suggestion": word} for word in dict.fromkeys(normalize_vocab(word) for word in words) if word]
+    if not rows:
+        return
     try:
-        supabase.table("suggested_vocab").insert([
-            {"phone_number": phone_number, "suggestion": vocab}
-        ]).execute()
+        execute(get_supabase().table("suggested_vocab").upsert(rows, on_conflict="phone_number,suggestion", ignore_duplicates=True))
     except Exception as e:
-        print("Supabase insertions error (phone_number):", e)
+        logger.error("Supabase insertions error (phone_number): %s", e)
+        return
+
+    add_to_vocab_summary(phone_number, [row["suggestion"] for row in rows])
 
 def get_all_learned_vocab_for_user(phone_number):
     try:
-        data = supabase.table("learned_vocab").select(
-            "*").eq("phone_number", phone_number).execute()
+        data = execute(get_supabase().table("learned_vocab").select(
+            "wop").eq("phone_number", phone_number))
     except Exception as e:
-        print("Supabase fetch error (phone_number):", e)
+        logger.error("Supabase fetch error (phone_number): %s", e)
         return []
     
     vocab = []
@@ -225,10 +1732,10 @@ def get_all_learned_vocab_for_user(phone_number):
 
 def get_all_suggested_vocab_for_user(phone_number):
     try:
-        data = supabase.table("suggested_vocab").select(
-            "*").eq("phone_number", phone_number).execute()
+        data = execute(get_supabase().table("suggested_vocab").select(
+            "suggestion").eq("phone_number", phone_number))
     except Exception as e:
-        print("Supabase fetch error (phone_number):", e)
+        logger.error("Supabase fetch error (phone_number): %s", e)
         return []
     
     vocab = []
@@ -237,14 +1744,39 @@ def get_all_suggested_vocab_for_user(phone_number):
     
     return vocab
 
+def get_vocab_summary(phone_number):
+    """Get the user's VocabSummary, loading it from Supabase if it isn't cached or has expired."""
+    with vocab_summaries_lock:
+        summary = vocab_summaries.get(phone_number)
+        if summary is not None and not summary.is_expired():
+            vocab_summaries.move_to_end(phone_number)
+            return summary
+
+    words = [*get_all_learned_vocab_for_user(phone_number), *get_all_suggested_vocab_for_user(phone_number)]
+    summary = VocabSummary(words, suggest_prompt_excluded_words, vocab_summary_ttl_seconds)
+
+    with vocab_summaries_lock:
+        vocab_summaries[phone_number] = summary
+        while len(vocab_summaries) > vocab_summary_users:
+            vocab_summaries.popitem(last=False)
+    return summary
+
+def add_to_vocab_summary(phone_number, words):
+    """Keep a cached VocabSummary in step with a write; uncached users load it fresh later."""
+    with vocab_summaries_lock:
+        summary = vocab_summaries.get(phone_number)
+    if summary is not None:
+        summary.add(words)
+
+def forget_vocab_summary(phone_number):
+    with vocab_summaries_lock:
+        vocab_summaries.pop(phone_number, None)
+
 """
 BASIC INFO FUNCTIONS
 """
 
-def phone_number_has_completed_basic_info(phone_number):
-    # Check if the user exists and create it if they don't
-    user = get_user(phone_number)
-
+def phone_number_has_completed_basic_info(user):
     # Go through the user's data and check if they have completed the basic info
     if (user.data["name"] == None):
         return Basic_Info_Stage.NO_NAME.name
@@ -259,41 +1791,35 @@ def phone_number_has_completed_basic_info(phone_number):
 
     return Basic_Info_Stage.COMPLETED.name
 
-def take_info_quiz(stage, phone_number, incoming_message):
+def take_info_quiz(stage, user, incoming_message):
     """Ask the user some basic questions to learn more about them"""
-    user = get_user(phone_number)
-    print("user: ", user)
-    print("stored info stage on user profile: ", user.data["info_stage"])
-    print("claimed stage: ", stage) 
+    logger.debug("Onboarding stage %s (stored stage %s)", stage, user.data["info_stage"])
+
+    # The answer to the current question is saved together with the next
+    # stage, so each step is a single write and never leaves the row half-updated
+    answers = {}
 
     # Name
     if (stage == Basic_Info_Stage.NO_NAME.name and stage == user.data["info_stage"]):
-        try:
-            res = supabase.table("users").update({ "name": incoming_message }).eq("phone_number", phone_number).execute()
-            user.data = res.data[0]
-        except Exception as e:
-            print("Supabase insertions error (user name insertion):", e)
+        answers["name"] = incoming_message
         stage = Basic_Info_Stage.NO_LOCATION.name
     elif (stage == Basic_Info_Stage.NO_NAME.name):
         try:
-            supabase.table("users").update({ "info_stage": stage }).eq("phone_number", phone_number).execute()
+            update_user(user, { **answers, "info_stage": stage })
         except Exception as e:
-            print("Supabase insertions error (info stage update):", e)
-        return respond("Welcome to Teleglot! Teleglot is a ChatGPT-powered language learning service. We're going to walk your a quick quiz to learn some more information about you.\n\nWhat is your first and last name?")
+            logger.error("Supabase insertions error (user info/info stage update): %s", e)
+        return "Welcome to Teleglot! Teleglot is a ChatGPT-powered language learning service. We're going to walk your a quick quiz to learn some more information about you.\n\nWhat is your first and last name?"
 
     # Location
     if (stage == Basic_Info_Stage.NO_LOCATION.name and stage == user.data["info_stage"]):
-        try:
-            supabase.table("users").update({ "location": incoming_message }).eq("phone_number", phone_number).execute()
-        except Exception as e:
-            print("Supabase insertions error (user location):", e)
+        answers["location"] = incoming_message
         stage = Basic_Info_Stage.NO_AGE.name
     elif (stage == Basic_Info_Stage.NO_LOCATION.name):
         try:
-            supabase.table("users").update({ "info_stage": stage }).eq("phone_number", phone_number).execute()
+            update_user(user, { **answers, "info_stage": stage })
         except Exception as e:
-            print("Supabase insertions error (info stage update):", e)
-        return respond(f"Hi {user.data['name']}! Where are you from?")
+            logger.error("Supabase insertions error (user info/info stage update): %s", e)
+        return f"Hi {user.data['name']}! Where are you from?"
 
     # Age
     if (stage == Basic_Info_Stage.NO_AGE.name and stage == user.data["info_stage"]):
@@ -301,60 +1827,49 @@ def take_info_quiz(stage, phone_number, incoming_message):
         try:
             incoming_message = int(incoming_message)
         except:
-            return respond("Please enter a valid age (in years).")
+            return "Please enter a valid age (in years)."
 
-        try:
-            supabase.table("users").update({ "age": incoming_message }).eq("phone_number", phone_number).execute()
-        except Exception as e:
-            print("Supabase insertions error (user location):", e)
+        answers["age"] = incoming_message
         stage = Basic_Info_Stage.NO_PROFICIENCY.name
     elif (stage == Basic_Info_Stage.NO_AGE.name):
         try:
-            supabase.table("users").update({ "info_stage": stage }).eq("phone_number", phone_number).execute()
+            update_user(user, { **answers, "info_stage": stage })
         except Exception as e:
-            print("Supabase insertions error (info stage update):", e)
-        return respond(f"How old are you (in years)?")
+            logger.error("Supabase insertions error (user info/info stage update): %s", e)
+        return f"How old are you (in years)?"
 
     # Proficiency/Level of Spanish
     if (stage == Basic_Info_Stage.NO_PROFICIENCY.name and stage == user.data["info_stage"]):
         # Check if the profiency is valid (beginner/intermediate/advanced)
         if (incoming_message.lower() not in ["beginner", "intermediate", "advanced"]):
-            return respond("Please enter a valid proficiency (beginner/intermediate/advanced).")
+            return "Please enter a valid proficiency (beginner/intermediate/advanced)."
 
-        try:
-            supabase.table("users").update({ "proficiency": incoming_message }).eq("phone_number", phone_number).execute()
-        except Exception as e:
-            print("Supabase insertions error (user location):", e)
+        answers["proficiency"] = incoming_message
         stage = Basic_Info_Stage.NO_INTERESTS.name
     elif (stage == Basic_Info_Stage.NO_PROFICIENCY.name):
         try:
-            supabase.table("users").update({ "info_stage": stage }).eq("phone_number", phone_number).execute()
+            update_user(user, { **answers, "info_stage": stage })
         except Exception as e:
-            print("Supabase insertions error (info stage update):", e)
-        return respond(f"What is your level of experience? (Beginner, Intermediate, or Advanced)")
+            logger.error("Supabase insertions error (user info/info stage update): %s", e)
+        return f"What is your level of experience? (Beginner, Intermediate, or Advanced)"
 
     # Interests
     if (stage == Basic_Info_Stage.NO_INTERESTS.name and stage == user.data["info_stage"]):
         try:
-            supabase.table("users").update({ "interests": incoming_message }).eq("phone_number", phone_number).execute()
-        except Exception as e:
-            print("Supabase insertions error (user location):", e)
-
-        try:
-            supabase.table("users").update({ "info_stage": Basic_Info_Stage.COMPLETED.name }).eq("phone_number", phone_number).execute()
+            update_user(user, { "interests": incoming_message, "info_stage": Basic_Info_Stage.COMPLETED.name })
         except Exception as e:
-            print("Supabase insertions error (info stage update):", e)
+            logger.error("Supabase insertions error (user interests/info stage update): %s", e)
 
         stage = Basic_Info_Stage.COMPLETED.name
-        return respond(f"Thanks for taking our intro quiz {user.data['name']}! You are now ready to start learning Spanish with Teleglot! See our main menu now below:\n\n{main_menu_text}")
+        return f"Thanks for taking our intro quiz {user.data['name']}! You are now ready to start learning Spanish with Teleglot! See our main menu now below:\n\n{main_menu_text}"
     elif (stage == Basic_Info_Stage.NO_INTERESTS.name):
         try:
-            supabase.table("users").update({ "info_stage": stage }).eq("phone_number", phone_number).execute()
+            update_user(user, { **answers, "info_stage": stage })
         except Exception as e:
-            print("Supabase insertions error (info stage update):", e)
-        return respond(f"What are your interests? (separated by commas) Ex: Sports, Music, Art")
+            logger.error("Supabase insertions error (user info/info stage update): %s", e)
+        return f"What are your interests? (separated by commas) Ex: Sports, Music, Art"
 
-    return respond("Something went wrong. Please try again later.")
+    return "Something went wrong. Please try again later."
 
 """
 LEARN FUNCTION
@@ -362,136 +1877,566 @@ LEARN FUNCTION
 def handle_learn_request(phone_number, wop):
     """This function generates the translation and sample sentence using OpenAi"""
 
-    # Get the translation, pronounciation, and sample sentence from ChatGPT
-    try:
-        generated_text = prompt_chatgpt_for_translation_pronunciation_and_sample_sentence(wop)
-    except Exception as e:
-        print("ChatGPT error:", e)
-        return respond("Error: Unable to get translation. Please try again later.")
-    
-    print("Generated Text: ", generated_text)
+    # A comma or line separated list is saved in one go; its cards are written on first Learn
+    words = split_words(wop)
+    if len(words) > 1:
+        return handle_bulk_learn_request(phone_number, words)
+
+    # Popular words are answered from the lexicon or the shared cache instead of ChatGPT
+    cache_key = normalize_vocab(wop)
+    if not cache_key:
+        return "Please include a word or phrase to learn. Ex: 'Learn water'"
+    learned_text = f"Learned word or phrase: {wop}\n\n"
+    entry = lexicon.lookup(cache_key)
+    if entry:
+        insert_vocab(phone_number, wop)
+        return f"{learned_text}{format_lexicon_entry(entry)}"
+    generated_text = learn_card_cache.get(cache_key)
+    llm_metrics.record_cache("learn", bool(generated_text))
 
-    # Check if the generated text is empty
+    # Get the translation, pronounciation, and sample sentence from ChatGPT
+    streamed = False
     if not generated_text:
-        return respond("Error: Unable to get translation. Please try again later.")
+        try:
+            if learn_batch_window_ms > 0:
+                generated_text = batched_learn_card(cache_key)
+            elif can_stream_replies():
+                streamed = True
+                generated_text = stream_reply(prompt_chatgpt_for_translation_pronunciation_and_sample_sentence(wop, stream=True), prefix=learned_text)
+            else:
+                generated_text = prompt_chatgpt_for_translation_pronunciation_and_sample_sentence(wop)
+        except Exception as e:
+            logger.error("ChatGPT error: %s", e)
+            return "Error: Unable to get translation. Please try again later."
+
+        # Check if the generated text is empty
+        if not generated_text:
+            return "Error: Unable to get translation. Please try again later."
+
+        learn_card_cache.set(cache_key, generated_text)
 
     # Concatenate thhe first part of the response with the generated text and respond to user
-    combined_wop_and_response = f"Learned word or phrase: {wop}\n\n{generated_text}"
-    print(combined_wop_and_response)
+    combined_wop_and_response = f"{learned_text}{generated_text}"
 
     # Insert learned phrase/word into database
     insert_vocab(phone_number, wop)
 
-    return respond(combined_wop_and_response)
+    return None if streamed else combined_wop_and_response
+
+def batched_learn_card(word):
+    """
+    The learn card for `word`, written in one prompt with the other words being learned right now.
+
+    Falls back to the single word prompt when the batch reply left the word
+    out or wasn't a JSON object of strings (prompt_chatgpt_for_learn_cards
+    raises ValueError for any other shape), and on any error when the word
+    was the only one in its batch.
+    """
+    future = learn_batcher.submit(word)
+    try:
+        return future.result()
+    except Exception as e:
+        if not isinstance(e, (KeyError, ValueError)) and getattr(future, "batch_size", 0) > 1:
+            raise
+        logger.warning("Learn card batch had no usable card (%s), asking for the word alone", type(e).__name__)
+        return prompt_chatgpt_for_translation_pronunciation_and_sample_sentence(word)
+
+def learn_batch_deadline_seconds(size):
+    """The ChatGPT deadline for a batch of `size` learn cards: the Learn deadline plus `learn_batch_seconds_per_word` per extra word."""
+    return llm_deadline_seconds["learn"] + learn_batch_seconds_per_word * max(size - 1, 0)
+
+def handle_bulk_learn_request(phone_number, words):
+    """
+    Save several words at once.
+
+    Their learn cards are only written when the user asks for one with
+    'Learn ___', so a long list costs one rate limited command, not a
+    ChatGPT prompt per `learn_card_batch_size` words.
+    """
+    unique_words = list(dict.fromkeys(words))
+    new_words = insert_vocab_batch(phone_number, unique_words[:vocab_import_batch_size])
+    skipped = f"\n\nOnly the first {vocab_import_batch_size} words were saved." if len(unique_words) > vocab_import_batch_size else ""
+
+    if not new_words:
+        return f"You have already learned all of those words. Text 'Learn ___' with one of them to see it again.{skipped}"
+    return f"Added {len(new_words)} words: {', '.join(new_words)}\n\n" \
+           f"Text 'Learn ___' with any of them to see its translation, pronunciation, and a sample sentence.{skipped}"
+
+
+def import_vocab(phone_number, words):
+    """
+    Save an iterable of words for the user, `vocab_import_batch_size` per upsert.
+
+    Words are read lazily, so a large upload is never held in memory. Learn
+    cards are left for 'Learn ___' to write, as in handle_bulk_learn_request.
+    Returns (words read, new words saved, whether words past
+    `vocab_import_max_words` were left out).
+    """
+    def save(batch):
+        return len(insert_vocab_batch(phone_number, batch))
+
+    total = new = 0
+    truncated = False
+    batch = []
+    for word in words:
+        if total >= vocab_import_max_words:
+            truncated = True
+            break
+        total += 1
+        batch.append(word)
+        if len(batch) >= vocab_import_batch_size:
+            new += save(batch)
+            batch = []
+    if batch:
+        new += save(batch)
+    return total, new, truncated
+
+
+def read_import_words(stream):
+    """
+    Yield the word in the first column of each row of an uploaded file.
+
+    Accepts CSV files and Anki's "Notes in Plain Text" export, which is tab
+    separated, may start with '#' header lines and may contain HTML.
+    """
+    lines = (line.decode("utf-8-sig", errors="replace") for line in stream)
+    lines = (line for line in lines if line.strip() and not line.startswith("#"))
+    first_line = next(lines, None)
+    if first_line is None:
+        return
+    delimiter = "\t" if "\t" in first_line else ","
+    for row_number, row in enumerate(csv.reader(chain([first_line], lines), delimiter=delimiter)):
+        word = normalize_vocab(re.sub(r"<[^>]+>", " ", row[0])) if row else ""
+        if row_number == 0 and word in ("word", "wop", "english", "front"):
+            continue
+        if word:
+            yield word
+
+
+def schedule_learn_card_fill(words):
+    """Generate learn cards for new words on the background pool, so 'Learn ___' is instant later."""
+    if words and not background_pool.submit(fill_learn_cards, words):
+        logger.warning("Background pool full, skipping learn cards for %s words", len(words))
+
+
+def fill_learn_cards(words):
+    """Cache learn cards for the words that have none, `learn_card_batch_size` words per ChatGPT prompt."""
+    missing = [word for word in dict.fromkeys(words) if lexicon.lookup(word) is None and not learn_card_cache.get(word)]
+    for start in range(0, len(missing), learn_card_batch_size):
+        try:
+            cards = prompt_chatgpt_for_learn_cards(missing[start:start + learn_card_batch_size])
+        except Exception as e:
+            logger.error("ChatGPT error (learn card batch): %s", e)
+            continue
+        for word, card in cards.items():
+            learn_card_cache.set(word, card)
 
 """
 SUGGEST FUNCTION
 """
-def handle_suggest_request(phone_number):
-    # Get the user
-    user = get_user(phone_number)
-
-    # Get the words that the user has already learned
-    vocab = get_all_learned_vocab_for_user(phone_number)
-    print('previously learned vocab', vocab)
+def handle_suggest_request(user):
+    phone_number = user.data["phone_number"]
 
-    # Get the words the ChatGPT has previously suggested
-    suggested_vocab = get_all_suggested_vocab_for_user(phone_number)
-    print('suggested vocab', suggested_vocab)
+    # Everything the user has learned or been suggested, without a full reload each time
+    summary = get_vocab_summary(phone_number)
 
-    # Get the recommendations from ChatGPT
+    # Ask for a few extra words, with only the most recent words excluded in the
+    # prompt, and drop anything the user has already seen locally
     try:
-        response = prompt_chatgpt_for_recommended_words(user, [*vocab, *suggested_vocab])
+        response = prompt_chatgpt_for_recommended_words(user, summary.recent_words(), suggest_candidate_words)
     except Exception as e:
-        print("ChatGPT error:", e)
-        return respond("Error: Unable to get recommendations. Please try again later.")
-    insert_suggested_vocab(phone_number, response)
+        logger.error("ChatGPT error: %s", e)
+        return "Error: Unable to get recommendations. Please try again later."
 
-    return respond(f"Hey, {user.data['name']}! Check out the following vocab suggestions from ChatGPT:\n\n {response}")
+    # Other forms of a word the user has seen, or of another suggestion, count as seen too
+    suggestions = []
+    keys = set()
+    for word in split_words(response):
+        key = vocab_key(word)
+        if key not in keys and summary.near_duplicate(word) is None:
+            suggestions.append(word)
+            keys.add(key)
+    suggestions = suggestions[:3]
+    if not suggestions:
+        return "Error: Unable to get recommendations. Please try again later."
+
+    insert_suggested_vocab(phone_number, suggestions)
+
+    # Write all of their learn cards in one prompt now, rather than one prompt per 'Learn ___' later
+    schedule_learn_card_fill(suggestions)
+
+    return f"Hey, {user.data['name']}! Check out the following vocab suggestions from ChatGPT:\n\n {', '.join(suggestions)}"
 
 
 """
 ARTICLE FUNCTION
 """
-def handle_article_request(phone_number):
-    user = get_user(phone_number)
+def handle_article_request(user):
+    # Today's article is shared by everyone with the same profile bucket
+    cache_key, audience = article_cache_key(user.data)
+    article = article_cache.get(cache_key)
+    llm_metrics.record_cache("article", bool(article))
+    if article:
+        return article
+
+    streamed = can_stream_replies()
+    try:
+        if streamed:
+            article = stream_reply(prompt_chatgpt_for_article(*audience, stream=True))
+        else:
+            article = prompt_chatgpt_for_article(*audience)
+    except Exception as e:
+        logger.error("ChatGPT error: %s", e)
+        return "Error: Unable to get article. Please try again later."
+
+    article_cache.set(cache_key, article)
+    return None if streamed else article
+
+
+def article_cache_key(profile):
+    """
+    Bucket a user's profile into (proficiency, interest, region) for today.
+
+    The interest bucket is the first interest the user listed and the region
+    is the first part of their location, so 'Boston, MA' and 'boston' share
+    articles. Returns (cache key, (proficiency, interest, region)).
+    """
+    proficiency = normalize_vocab(profile["proficiency"] or "") or "beginner"
+    interest = next(iter(split_words(profile["interests"] or "")), "current events")
+    region = next(iter(split_words(profile["location"] or "")), "the world")
+    return f"{date.today()}|{proficiency}|{interest}|{region}", (proficiency, interest, region)
+
+
+def warm_article_cache(page_size=1000):
+    """Generate today's article for every profile bucket that isn't cached yet."""
+    audiences = {}
+    for page in count(0, page_size):
+        try:
+            data = execute(get_supabase().table("users").select(
+                "proficiency, interests, location").eq("info_stage", Basic_Info_Stage.COMPLETED.name).order("phone_number").range(page, page + page_size - 1))
+        except Exception as e:
+            logger.error("Supabase fetch error (article warm up): %s", e)
+            break
+        for profile in data.data:
+            cache_key, audience = article_cache_key(profile)
+            audiences[cache_key] = audience
+        if len(data.data) < page_size:
+            break
+
+    missing = {key: audience for key, audience in audiences.items() if not article_cache.get(key)}
+    articles = {key: prompt_executor.submit(prompt_chatgpt_for_article, *audience) for key, audience in missing.items()}
+    for key, article in articles.items():
+        try:
+            article_cache.set(key, article.result())
+        except Exception as e:
+            logger.error("ChatGPT error (article warm up): %s", e)
+    return len(audiences), len(missing)
+
+
+@app.cli.command("warm-articles")
+def warm_articles_command():
+    """Pre-generate today's articles; run daily from cron before users wake up."""
+    buckets, generated = warm_article_cache()
+    print(f"Article cache warm: {buckets} profile buckets, {generated} articles generated")
+
+"""
+BROADCAST FUNCTION
+"""
+def broadcast(kind, from_number, checkpoint_path, page_size=1000):
+    """
+    Send today's word or article to every user who has finished the intro quiz.
+
+    Users are read a page at a time in phone number order and messages are
+    sent by a pool of `broadcast_workers` threads, paced by a TokenBucket.
+    Content is generated once per profile bucket. The buckets' content and
+    the last phone number sent are saved to the checkpoint as the run goes,
+    so rerunning an interrupted broadcast on the same day picks up where it
+    stopped. Returns (sent, failed).
+    """
+    checkpoint = load_broadcast_checkpoint(checkpoint_path, kind)
+    send_limit = TokenBucket(broadcast_rate_per_second, broadcast_burst)
+    sender = ThreadPoolExecutor(max_workers=broadcast_workers, thread_name_prefix="teleglot-broadcast")
+    try:
+        while True:
+            query = get_supabase().table("users").select("phone_number, proficiency, interests, location").eq(
+                "info_stage", Basic_Info_Stage.COMPLETED.name).order("phone_number").limit(page_size)
+            if checkpoint["last_phone_number"]:
+                query = query.gt("phone_number", checkpoint["last_phone_number"])
+            try:
+                users = execute(query).data
+            except Exception as e:
+                logger.error("Supabase fetch error (broadcast): %s", e)
+                break
+            if not users:
+                break
+
+            contents = broadcast_contents(kind, users, checkpoint["contents"])
+            for start in range(0, len(users), broadcast_checkpoint_every):
+                chunk = users[start:start + broadcast_checkpoint_every]
+                sends = []
+                for profile in chunk:
+                    body = contents.get(broadcast_bucket(kind, profile)[0])
+                    if body is None:
+                        checkpoint["failed"] += 1
+                        continue
+                    sends.append(sender.submit(send_broadcast_message, send_limit, profile["phone_number"], from_number, body))
+                for send in as_completed(sends):
+                    checkpoint["sent" if send.result() else "failed"] += 1
+                checkpoint["last_phone_number"] = chunk[-1]["phone_number"]
+                save_broadcast_checkpoint(checkpoint_path, checkpoint)
+            logger.info("Broadcast progress: %s sent, %s failed", checkpoint["sent"], checkpoint["failed"])
+
+            if len(users) < page_size:
+                break
+    finally:
+        sender.shutdown()
+    return checkpoint["sent"], checkpoint["failed"]
+
+
+def broadcast_bucket(kind, profile):
+    """
+    Group a user with everyone who gets the same broadcast.
+
+    Articles use the article cache buckets; daily words only depend on
+    proficiency and interest. Returns (bucket key, (proficiency, interest, region)).
+    """
+    cache_key, audience = article_cache_key(profile)
+    if (kind == "article"):
+        return cache_key, audience
+    return f"{audience[0]}|{audience[1]}", audience
+
+
+def broadcast_contents(kind, users, contents):
+    """Generate the message for each of the users' buckets that isn't in `contents` yet, concurrently."""
+    missing = {}
+    for profile in users:
+        bucket, audience = broadcast_bucket(kind, profile)
+        if bucket not in contents:
+            missing[bucket] = audience
+
+    generate = daily_article_message if kind == "article" else daily_word_message
+    messages = {bucket: prompt_executor.submit(generate, *audience) for bucket, audience in missing.items()}
+    for bucket, message in messages.items():
+        try:
+            contents[bucket] = message.result()
+        except Exception as e:
+            logger.error("ChatGPT error (broadcast): %s", e)
+    return contents
+
+
+def daily_article_message(proficiency, interest, region):
+    cache_key = article_cache_key({"proficiency": proficiency, "interests": interest, "location": region})[0]
+    article = article_cache.get(cache_key)
+    if not article:
+        article = prompt_chatgpt_for_article(proficiency, interest, region)
+        article_cache.set(cache_key, article)
+    return f"Your daily Spanish article:\n\n{article}"
+
+
+def daily_word_message(proficiency, interest, region):
+    wop = normalize_vocab(prompt_chatgpt_for_daily_word(proficiency, interest))
+    if not wop:
+        raise ValueError("ChatGPT did not suggest a word of the day")
+
+    # The card comes from the lexicon or learn card cache when it can, like a Learn request
+    entry = lexicon.lookup(wop)
+    card = format_lexicon_entry(entry) if entry else learn_card_cache.get(wop)
+    if not card:
+        card = prompt_chatgpt_for_translation_pronunciation_and_sample_sentence(wop)
+        learn_card_cache.set(wop, card)
+    return f"Word of the day: {wop}\n\n{card}\n\nText 'Learn {wop}' to add it to your words."
+
+
+def send_broadcast_message(send_limit, to_number, from_number, body):
+    """Send one broadcast message, taking a rate limit token for each part Twilio sends. Returns whether it was sent."""
     try:
-        print("Getting article from ChatGPT")
-        article = prompt_chatgpt_for_article(user)
-        print(article)
+        for part in split_message(body):
+            send_limit.acquire()
+            send_message(to_number, from_number, part)
+        return True
     except Exception as e:
-        print("ChatGPT error:", e)
-        return respond("Error: Unable to get article. Please try again later.")
-    return respond(article)
+        logger.error("Twilio error (broadcast): %s", e)
+        return False
+
+
+def load_broadcast_checkpoint(path, kind):
+    """Today's checkpoint for `kind`, or a fresh one."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        checkpoint = None
+    if not checkpoint or checkpoint.get("date") != str(date.today()) or checkpoint.get("kind") != kind:
+        checkpoint = {"date": str(date.today()), "kind": kind, "last_phone_number": None, "sent": 0, "failed": 0, "contents": {}}
+    return checkpoint
+
+
+def save_broadcast_checkpoint(path, checkpoint):
+    # Write a temporary file and rename it so an interrupted run never leaves half a checkpoint
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary_path, path)
+
+
+@app.cli.command("broadcast")
+@click.argument("kind", type=click.Choice(["word", "article"]))
+@click.option("--from", "from_number", default=broadcast_from_number, help="WhatsApp number to send from (BROADCAST_FROM_NUMBER).")
+@click.option("--checkpoint", "checkpoint_path", default=None, help="Checkpoint file (default broadcast-KIND.checkpoint.json).")
+def broadcast_command(kind, from_number, checkpoint_path):
+    """Send today's word or article to every user; run daily from cron."""
+    if not from_number:
+        raise click.UsageError("Set BROADCAST_FROM_NUMBER or pass --from")
+    checkpoint_path = checkpoint_path or f"broadcast-{kind}.checkpoint.json"
+    sent, failed = broadcast(kind, from_number, checkpoint_path, broadcast_page_size)
+    print(f"Broadcast finished: {sent} sent, {failed} failed")
 
 """
 QUIZ FUNCTION
 """
-def handle_quiz_request(phone_number):
+def handle_quiz_request(user):
     """
     Two Steps for Quiz Mode:
 
     1) Show the user the quiz
-      - Get the words that the user has learned
+      - Get the learned word whose review is due soonest
       - If the user has learned <4 words, tell them that they need to learn more words
-      - Create a quiz with 4 randomly selected words from ChatGPT
+      - Create a quiz for that word with 3 other words from ChatGPT
       - Store the answer in the database
       - Set the quiz mode to active
       - Send the quiz to the user
     """
-    # Get the words that the user has already learned
-    vocab = get_all_learned_vocab_for_user(phone_number)
+    phone_number = user.data["phone_number"]
+
+    # Quiz the word whose review is due soonest; one indexed query instead of loading every word
+    due_vocab, vocab_count = get_due_vocab(phone_number, 1)
 
     # Check if the user has learned enough words to take the quiz
-    if (len(vocab) < 4):
-        return respond("You need to learn more words before you can take the quiz. Text 'Learn ___' to learn a new word.")
-    
-    # Select 1 random words from the user's learned vocab
-    random_vocab = choice(vocab)
+    if (vocab_count < 4):
+        return "You need to learn more words before you can take the quiz. Text 'Learn ___' to learn a new word."
+    wop = due_vocab[0]
+
+    # Use a quiz generated ahead of time when there is one ready, otherwise build it now
+    quiz, remaining = pop_pooled_quiz(phone_number, wop)
+    llm_metrics.record_cache("quiz", quiz is not None)
+    if (quiz is None):
+        try:
+            quiz = build_quiz(wop)
+        except Exception as e:
+            logger.error("ChatGPT error: %s", e)
+            return "Error: Unable to send quiz. Please try again later."
 
-    # Get the spanish translation of the randomly selected word
-    try:
-        spanish_translation = prompt_chatgpt_for_translation(random_vocab)
-    except Exception as e:
-        print("ChatGPT error:", e)
-        return respond("Error: Unable to send quiz. Please try again later.")
-    
-    # Get the other words for the quiz from ChatGPT
+    # Top the pool back up off the hot path
+    if (remaining < quiz_pool_low_water or quiz.get("id") is None):
+        schedule_quiz_pool_refill(phone_number)
+
+    # Store the answer and set the quiz mode to active in a single write
     try:
-        incorrect_quiz_answers = prompt_chatgpt_for_mc_words(random_vocab)
+        update_user(user, { "quiz_answer": quiz["answer_index"], "quiz_wop": wop, "is_in_quiz_mode": True })
     except Exception as e:
-        print("ChatGPT error:", e)
-        return respond("Error: Unable to send quiz. Please try again later.")
+        logger.error("Supabase insertions error (quiz answer/quiz mode): %s", e)
+        return "Error: Unable to send quiz. Please try again later."
+
+    # Send the quiz to the user
+    options = quiz["options"]
+    return f"What is the translation of {quiz['spanish']} in English? (Type the number corresponding the correct answer)\n\n"\
+            f"1) {options[0]}\n\n" \
+            f"2) {options[1]}\n\n" \
+            f"3) {options[2]}\n\n" \
+            f"4) {options[3]}\n\n"
+
+
+def build_quiz(wop):
+    """Generate a quiz for `wop` with its answers shuffled, shaped like a quiz_pool row."""
+    spanish_translation, options = generate_quiz(wop)
 
     # randomly sort the incorrect quiz answers
-    incorrect_quiz_answers_list = incorrect_quiz_answers.replace(" ", "").split(",")
-    incorrect_quiz_answers_list.append(random_vocab)
-    shuffle(incorrect_quiz_answers_list)
-    correct_answer_index = incorrect_quiz_answers_list.index(random_vocab) + 1
-    
-    # Store the answer in the database
-    try:
-        supabase.table("users").update({ "quiz_answer": correct_answer_index }).eq("phone_number", phone_number).execute()
-    except Exception as e:
-        print("Supabase insertions error (quiz answer):", e)
-        return respond("Error: Unable to send quiz. Please try again later.")
+    options.append(wop)
+    shuffle(options)
+    return {"wop": wop, "spanish": spanish_translation, "options": options, "answer_index": options.index(wop) + 1}
 
-    # Set the quiz mode to active
-    try:
-        supabase.table("users").update({ "is_in_quiz_mode": True }).eq("phone_number", phone_number).execute()
-    except Exception as e:
-        print("Supabase insertions error (quiz mode):", e)
-        return respond("Error: Unable to send quiz. Please try again later.")
 
-    # Send the quiz to the user
-    return respond(f"What is the translation of {spanish_translation} in English? (Type the number corresponding the correct answer)\n\n"\
-            f"1) {incorrect_quiz_answers_list[0]}\n\n" \
-            f"2) {incorrect_quiz_answers_list[1]}\n\n" \
-            f"3) {incorrect_quiz_answers_list[2]}\n\n" \
-            f"4) {incorrect_quiz_answers_list[3]}\n\n")
+def schedule_quiz_pool_refill(phone_number):
+    """Refill the user's quiz pool on the background pool, at most once at a time per user."""
+    with quiz_pool_refills_lock:
+        if (phone_number in quiz_pool_refills):
+            return
+        quiz_pool_refills.add(phone_number)
+    if (not background_pool.submit(refill_quiz_pool, phone_number)):
+        with quiz_pool_refills_lock:
+            quiz_pool_refills.discard(phone_number)
 
 
-def handle_quiz_response(phone_number, incoming_message):
+def refill_quiz_pool(phone_number):
+    """Generate quizzes for the user's next due words, dropping pooled quizzes that are no longer next."""
+    try:
+        with app.app_context():
+            due_vocab, vocab_count = get_due_vocab(phone_number, quiz_pool_size)
+            if (vocab_count < 4):
+                return
+
+            pooled = get_pooled_quizzes(phone_number)
+            delete_pooled_quizzes([row["id"] for row in pooled if row["wop"] not in due_vocab])
+            pooled_vocab = {row["wop"] for row in pooled}
+
+            quizzes = []
+            for wop in due_vocab:
+                if (wop in pooled_vocab):
+                    continue
+                try:
+                    quizzes.append(build_quiz(wop))
+                except Exception as e:
+                    logger.error("ChatGPT error (quiz pool refill): %s", e)
+            insert_pooled_quizzes(phone_number, quizzes)
+    finally:
+        with quiz_pool_refills_lock:
+            quiz_pool_refills.discard(phone_number)
+
+
+def generate_quiz(wop):
+    """
+    Get the Spanish translation of `wop` and 3 English distractors.
+
+    Words in the lexicon are answered locally, with distractors spelled like
+    the word. Otherwise both come from one structured ChatGPT call, and if
+    that reply can't be parsed we fall back to the translation prompt plus
+    lexicon distractors (or the distractor prompt), run concurrently.
+    """
+    # Distractors are picked around the headword the entry was found under, so
+    # "apples" gets neither "apples" nor "apple" as a wrong answer
+    entry = lexicon.lookup(wop)
+    distractors = lexicon.similar_words(entry["english"] if entry else wop)
+    if entry and len(distractors) == 3:
+        return entry["spanish"], distractors
+
+    # Only a reply we couldn't parse is retried as separate prompts; a timeout
+    # or an open circuit breaker would just fail again, twice, so it's raised
+    try:
+        return prompt_chatgpt_for_quiz(wop)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning("ChatGPT quiz reply unusable, falling back to separate prompts: %s", type(e).__name__)
+
+    translation = prompt_executor.submit(prompt_chatgpt_for_translation, wop)
+    if len(distractors) < 3:
+        distractors = prompt_executor.submit(prompt_chatgpt_for_mc_words, wop).result()
+    return translation.result(), parse_distractors(distractors, wop)
+
+
+def parse_distractors(distractors, wop):
+    """Turn ChatGPT's distractors into exactly 3 answers that aren't the right one."""
+    if isinstance(distractors, str):
+        distractors = distractors.split(",")
+    words = []
+    for word in distractors:
+        word = str(word).strip().lower()
+        if word and word != wop.lower() and word not in words:
+            words.append(word)
+    if len(words) < 3:
+        raise ValueError(f"Expected 3 quiz distractors, got {words}")
+    return words[:3]
+
+
+def handle_quiz_response(user, incoming_message):
     """
     2) Check the user's answers
       Done:
@@ -504,93 +2449,243 @@ def handle_quiz_response(phone_number, incoming_message):
       - if the user's answer is incorrect, send them a message saying that they are incorrect and the correct answer
     """
 
-    # Get the user
-    user = get_user(phone_number)
-
     # if the user did not send a valid response, return
     if (not incoming_message.isdigit()):
-        return respond("Please enter a valid response (1, 2, 3, or 4).")
+        return "Please enter a valid response (1, 2, 3, or 4)."
     if (int(incoming_message) not in [1, 2, 3, 4]):
-        return respond("Please enter a valid response (1, 2, 3, or 4).")
+        return "Please enter a valid response (1, 2, 3, or 4)."
 
     # Check if the user's answer is correct
     answer_is_correct = int(incoming_message) == int(user.data["quiz_answer"])
 
     # Set quiz mode to inactive
     try:
-        supabase.table("users").update({ "is_in_quiz_mode": False }).eq("phone_number", phone_number).execute()
+        update_user(user, { "is_in_quiz_mode": False })
     except Exception as e:
-        print("Supabase update error (quiz mode):", e)
-        return respond("Error: Unable to complete quiz. Please try again later.")
+        logger.error("Supabase update error (quiz mode): %s", e)
+        return "Error: Unable to complete quiz. Please try again later."
+
+    # Reschedule the word's next review based on the answer
+    if (user.data.get("quiz_wop")):
+        review_vocab(user.data["phone_number"], user.data["quiz_wop"], answer_is_correct)
     
     # If the user's answer is correct, send them a message saying that they are correct
     if (answer_is_correct):
-        return respond("Correct! Great job!")
+        return "Correct! Great job!"
     else:
-        return respond(f"Incorrect. The correct answer was #{user.data['quiz_answer']}.")
+        return f"Incorrect. The correct answer was #{user.data['quiz_answer']}."
 
 
 """
 CHATGPT HELPER FUNCTIONS
 """
-def prompt_chatgpt_for_translation_pronunciation_and_sample_sentence(wop):
+def chat_completion(command, deadline_seconds=None, **kwargs):
+    """
+    Call ChatGPT through the gateway, recording telemetry under `command`.
+
+    The call gets the command's deadline (or `deadline_seconds`), transient errors are retried with
+    jittered backoff, and the circuit breaker fails fast while OpenAI is
+    degraded. With LLM_HEDGE on, a second request is sent if the first is
+    slower than the command's p95 latency.
+    """
+    started_at = time.perf_counter()
+    with tracer.span("openai", command=command, model=kwargs.get("model")):
+        try:
+            response = call_llm(command, lambda timeout: create_completion(command, timeout, kwargs), deadline_seconds)
+        except Exception as e:
+            llm_metrics.record_call(command, kwargs.get("model"), time.perf_counter() - started_at, error=e)
+            raise
+
+        usage = response.get("usage") or {}
+        tracer.annotate(prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0))
+    llm_metrics.record_call(command, kwargs.get("model"), time.perf_counter() - started_at,
+                            prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0))
+    return response
+
+def chat_completion_stream(command, **kwargs):
+    """Yield ChatGPT's reply text as it is generated, recording telemetry under `command`."""
+    started_at = time.perf_counter()
+    first_token_seconds = None
+    chunks = 0
+    stream = None
     try:
-        print("CHATGPT is going to be prompted")
-        openai_response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"What is the translation, pronunciation, and sample sentence for the word/phrase {wop} in the language Spanish? Include the English translation for the sample sentence. Only include the translation once.",
-                }
-            ]
-        )
+        with backend_limits["openai"]:
+            # Retries are only possible before anything has been sent to the user
+            stream = call_llm(command, lambda timeout: get_openai().ChatCompletion.create(stream=True, request_timeout=timeout, **kwargs))
+            for chunk in stream:
+                delta = chunk.choices[0].delta.get("content")
+                if delta:
+                    if first_token_seconds is None:
+                        first_token_seconds = time.perf_counter() - started_at
+                    chunks += 1
+                    yield delta
     except Exception as e:
-        print("ChatGPT error:", e)
-        return None
+        # Failures before the stream opened were already counted by call_llm
+        if stream is not None and isinstance(e, retryable_llm_errors()):
+            llm_circuit_breaker.record_failure()
+        llm_metrics.record_call(command, kwargs.get("model"), time.perf_counter() - started_at, error=e)
+        raise
+
+    # Streamed completions don't report usage; each chunk is roughly one token
+    tracer.annotate(stream_command=command, stream_first_token_ms=round((first_token_seconds or 0) * 1000, 3), stream_chunks=chunks)
+    llm_metrics.record_call(command, kwargs.get("model"), time.perf_counter() - started_at,
+                            completion_tokens=chunks, first_token_seconds=first_token_seconds)
+
+def retryable_llm_errors():
+    """Errors worth retrying; anything else means OpenAI rejected the request."""
+    error = get_openai().error
+    return (error.Timeout, error.APIConnectionError, error.RateLimitError, error.ServiceUnavailableError, error.APIError, error.TryAgain)
+
+def call_llm(command, attempt, deadline_seconds=None):
+    """Run `attempt(timeout)` behind the circuit breaker, retrying transient errors until the command's deadline (or `deadline_seconds`)."""
+    if deadline_seconds is None:
+        deadline_seconds = llm_deadline_seconds.get(command, llm_default_deadline_seconds)
+    deadline = time.monotonic() + deadline_seconds
+    for retry in count():
+        if not llm_circuit_breaker.allow():
+            raise LLMUnavailableError("ChatGPT is unavailable (circuit breaker open)")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMUnavailableError(f"ChatGPT deadline exceeded for {command}")
+
+        try:
+            result = attempt(remaining)
+        except Exception as e:
+            if not isinstance(e, retryable_llm_errors()):
+                # OpenAI answered, it just didn't like the request
+                llm_circuit_breaker.record_success()
+                raise
+            llm_circuit_breaker.record_failure()
+            backoff = uniform(0, llm_retry_base_seconds * 2 ** retry)
+            if retry >= llm_max_retries or time.monotonic() + backoff >= deadline:
+                raise
+            logger.warning("ChatGPT error (%s), retrying in %.2fs: %s", command, backoff, e)
+            llm_metrics.record_retry(command)
+            time.sleep(backoff)
+            continue
+
+        llm_circuit_breaker.record_success()
+        return result
+
+def create_completion(command, timeout, kwargs):
+    """One ChatGPT request, hedged with a second request when LLM_HEDGE is on."""
+    def create(request_timeout):
+        with backend_limits["openai"]:
+            return get_openai().ChatCompletion.create(request_timeout=request_timeout, **kwargs)
+
+    hedge_after = max(llm_hedge_min_seconds, llm_metrics.latency_percentile(command, 95))
+    if not llm_hedge or hedge_after >= timeout:
+        return create(timeout)
+
+    started_at = time.monotonic()
+    requests_in_flight = [hedge_executor.submit(create, timeout)]
+    done, _ = wait(requests_in_flight, timeout=hedge_after)
+    if not done:
+        llm_metrics.record_hedge(command)
+        requests_in_flight.append(hedge_executor.submit(create, timeout - hedge_after))
+
+    # Use whichever request succeeds first
+    error = None
+    try:
+        for request_in_flight in as_completed(requests_in_flight, timeout=timeout - (time.monotonic() - started_at)):
+            try:
+                return request_in_flight.result()
+            except Exception as e:
+                error = e
+    except FuturesTimeoutError:
+        raise get_openai().error.Timeout(f"ChatGPT request timed out after {timeout:.1f}s")
+    raise error
+
+def prompt_chatgpt_for_translation_pronunciation_and_sample_sentence(wop, stream=False):
+    messages = [
+        {
+            "role": "system",
+            "content": f"What is the translation, pronunciation, and sample sentence for the word/phrase {wop} in the language Spanish? Include the English translation for the sample sentence. Only include the translation once.",
+        }
+    ]
+    if stream:
+        return chat_completion_stream("learn", model="gpt-3.5-turbo", messages=messages)
+
+    openai_response = chat_completion(
+        "learn",
+        model="gpt-3.5-turbo",
+        messages=messages
+    )
     return openai_response.choices[0].message.content
 
-def prompt_chatgpt_for_recommended_words(user, previously_learned_vocab):
+def prompt_chatgpt_for_learn_cards(words, command="learn_batch", deadline_seconds=None):
+    """Learn cards for several words from one structured prompt. Returns {word: card} for the words ChatGPT answered."""
+    cards = chat_completion(
+        command,
+        deadline_seconds=deadline_seconds,
+        model="gpt-3.5-turbo",
+        messages=[
+            {
+                "role": "system",
+                "content": f"Reply with only a JSON object whose keys are exactly these English words or phrases: {json.dumps(words)}. The value for each is a plain text string with its translation, pronunciation, and sample sentence in the language Spanish. Include the English translation for the sample sentence. Only include the translation once.",
+            }
+        ]
+    )
+    cards = json.loads(cards.choices[0].message.content)
+    if not isinstance(cards, dict) or not all(isinstance(card, str) for card in cards.values()):
+        raise ValueError("Learn card reply is not a JSON object of strings")
+    wanted = set(words)
+    return {normalize_vocab(word): card.strip() for word, card in cards.items() if normalize_vocab(word) in wanted and card.strip()}
+
+def prompt_chatgpt_for_recommended_words(user, previously_learned_vocab, number_of_words=3):
     # Get the user's profile data
     name = user.data["name"]
     interests = user.data["interests"]
 
-    recommendations = openai.ChatCompletion.create(
+    recommendations = chat_completion(
+        "suggest",
         model="gpt-3.5-turbo",
         messages=[
             {
 
                 "role": "system",
-                "content": f"{name} is trying to learn Spanish. They are interested in {interests}. Using their interests, generate a list of 3 English words that might be useful to learn in Spanish. The generated words do not have to come from their interests, however. The suggestions can be random. Please only include real English words. Do not include the Spanish translation or any description. Separate each word by a comma with no numbers. Do not include any of the following words: {', '.join(previously_learned_vocab)}."
+                "content": f"{name} is trying to learn Spanish. They are interested in {interests}. Using their interests, generate a list of {number_of_words} English words that might be useful to learn in Spanish. The generated words do not have to come from their interests, however. The suggestions can be random. Please only include real English words. Do not include the Spanish translation or any description. Separate each word by a comma with no numbers. Do not include any of the following words: {', '.join(previously_learned_vocab)}."
             },
         ]
     )
 
     return recommendations.choices[0].message.content
 
-def prompt_chatgpt_for_article(user):
-    # Get the user's profile data
-    name = user.data["name"]
-    location = user.data["location"]
-    age = user.data["age"]
-    proficiency = user.data["proficiency"]
-    interests = user.data["interests"]
+def prompt_chatgpt_for_article(proficiency, interests, location, stream=False):
+    messages = [
+        {
+
+            "role": "system",
+            "content": f"A reader is trying to learn Spanish. They are located in {location}. Their Spanish proficiency level is {proficiency}. They are interested in {interests}. Today's date is {date.today()}. Using the information about the reader, generate a two paragraph news article for {date.today()}. Match it to their proficiency level. Include a label before the Spanish reading that says 'Spanish Article:' and is followed by two empty lines. Include a label fefore the English translation that says 'English Translation:' and is followed by two empty lines."
+        },
+    ]
+    if stream:
+        return chat_completion_stream("article", model="gpt-3.5-turbo", messages=messages)
 
-    recommendations = openai.ChatCompletion.create(
+    recommendations = chat_completion(
+        "article",
+        model="gpt-3.5-turbo",
+        messages=messages
+    )
+
+    return recommendations.choices[0].message.content
+
+def prompt_chatgpt_for_daily_word(proficiency, interest):
+    word = chat_completion(
+        "broadcast",
         model="gpt-3.5-turbo",
         messages=[
             {
-
                 "role": "system",
-                "content": f"{name} is trying to learn Spanish. They are located in {location}. They are {age} years old. Their Spanish proficiency level is {proficiency}. They are interested in {interests}. Today's date is {date.today()}. Using the information about {name}, generate a two paragraph news article for {date.today()}. Match it to their proficiency level. Include a label before the Spanish reading that says 'Spanish Article:' and is followed by two empty lines. Include a label fefore the English translation that says 'English Translation:' and is followed by two empty lines."
-            },
+                "content": f"A reader is learning Spanish. Their Spanish proficiency level is {proficiency}. They are interested in {interest}. Suggest one English word that would be useful for them to learn in Spanish today. Answer with just the one English word, with no Spanish translation, description, or punctuation.",
+            }
         ]
     )
-
-    return recommendations.choices[0].message.content
+    return word.choices[0].message.content
 
 def prompt_chatgpt_for_translation(wop):
-    translation = openai.ChatCompletion.create(
+    translation = chat_completion(
+        "quiz",
         model="gpt-3.5-turbo",
         messages=[
             {
@@ -601,8 +2696,23 @@ def prompt_chatgpt_for_translation(wop):
     )
     return translation.choices[0].message.content
 
+def prompt_chatgpt_for_quiz(wop):
+    quiz = chat_completion(
+        "quiz",
+        model="gpt-3.5-turbo",
+        messages=[
+            {
+                "role": "system",
+                "content": f"Reply with only a JSON object with two keys. \"translation\": just the one word or phrase that is a translation of '{wop}' into Spanish. \"distractors\": a list of 3 English words that could be confused with the word or phrase '{wop}' because they sound alike, have similar spellings, or have similar but different meanings. Only include the English word in the distractors, with no Spanish translation, description, or punctuation.",
+            }
+        ]
+    )
+    quiz = json.loads(quiz.choices[0].message.content)
+    return quiz["translation"].strip(), parse_distractors(quiz["distractors"], wop)
+
 def prompt_chatgpt_for_mc_words(wop):
-    recommendations = openai.ChatCompletion.create(
+    recommendations = chat_completion(
+        "quiz",
         model="gpt-3.5-turbo",
         messages=[
             {
@@ -614,6 +2724,173 @@ def prompt_chatgpt_for_mc_words(wop):
     return recommendations.choices[0].message.content.lower()
 
 
+"""
+MESSAGE PROCESSING FUNCTIONS
+"""
+def send_message(to_number, from_number, body):
+    """Deliver a reply through the Twilio REST client instead of the webhook response."""
+    for part in split_message(body):
+        with tracer.span("twilio", characters=len(part)), backend_limits["twilio"]:
+            get_twilio_client().messages.create(to=to_number, from_=from_number, body=part)
+
+
+def can_stream_replies():
+    """Replies can be streamed when the message is being processed off the webhook."""
+    return stream_replies and has_app_context() and g.get("reply_to") is not None
+
+
+def stream_reply(deltas, prefix=""):
+    """
+    Send a ChatGPT reply to the user while it is still being generated.
+
+    Text is sent a paragraph at a time once at least `stream_min_chunk_chars`
+    characters are ready, so the first message goes out long before the
+    completion finishes. Returns the generated text (without `prefix`).
+    """
+    to_number, from_number = g.reply_to
+    text = ""
+    pending = prefix
+    for delta in deltas:
+        text += delta
+        pending += delta
+        boundary = pending.rfind("\n\n")
+        if (boundary >= stream_min_chunk_chars):
+            send_message(to_number, from_number, pending[:boundary])
+            pending = pending[boundary:]
+        elif (len(pending) > whatsapp_message_limit):
+            cut = find_message_cut(pending, whatsapp_message_limit)
+            send_message(to_number, from_number, pending[:cut])
+            pending = pending[cut:]
+    if (pending.strip()):
+        send_message(to_number, from_number, pending)
+    return text
+
+
+def process_message_in_background(user_phone_number, our_phone_number, incoming_message, webhook_span=None):
+    """Run a message on the worker pool and send the reply once it is ready."""
+    with tracer.span("background", parent=webhook_span), app.app_context():
+        # Handlers that stream their reply send it themselves and return None
+        g.reply_to = (user_phone_number, our_phone_number)
+        reply = process_message(user_phone_number, incoming_message)
+        logger.debug("Supabase round trips for this message: %s", g.get("db_round_trips", 0))
+        if (reply):
+            send_message(user_phone_number, our_phone_number, reply)
+
+
+def run_limited_command(user_phone_number, incoming_message, handler, *args):
+    """Run a command that calls ChatGPT, subject to rate limits and coalesced with identical in-flight requests."""
+    limit = command_rate_limiter.allow(user_phone_number)
+    if (limit == "user"):
+        return "You're sending requests a little too quickly. Please wait a moment and try again."
+    if (limit == "global"):
+        return "Teleglot is very busy right now. Please try again in a minute."
+
+    return command_flights.do((user_phone_number, normalize_vocab(incoming_message)), handler, *args)
+
+
+def process_message(user_phone_number, incoming_message):
+    """Route an incoming message to the handler for the user's conversation state and return the reply text."""
+    # Most messages find their session in memory; otherwise the user's row is loaded once
+    with tracer.span("process_message") as span:
+        session = sessions.get(user_phone_number)
+        if (session is None):
+            session = Session(get_user(user_phone_number), session_ttl_seconds)
+            sessions.put(user_phone_number, session)
+        if (span is not None):
+            span.attributes["state"] = session.state.name
+
+        reply = state_handlers[session.state](session, incoming_message)
+        session.refresh()
+        if (span is not None):
+            span.attributes["db_round_trips"] = g.get("db_round_trips", 0)
+        return reply
+
+
+def handle_onboarding_message(session, incoming_message):
+    """New users answer some basic questions before they can use the menu."""
+    stage = phone_number_has_completed_basic_info(session.user)
+    return take_info_quiz(stage, session.user, incoming_message)
+
+
+def handle_quiz_message(session, incoming_message):
+    """While a quiz is open, every message is an answer to it."""
+    return handle_quiz_response(session.user, incoming_message)
+
+
+def handle_menu_message(session, incoming_message):
+    """Look the message up in menu_commands, either as a whole or as a command followed by its argument."""
+    command, argument = incoming_message.lower(), ""
+    if (command not in menu_commands):
+        command = command.partition(" ")[0]
+        argument = incoming_message[len(command) + 1:]
+
+    handler, takes_argument = menu_commands.get(command, (None, False))
+    if (handler is None or (argument and not takes_argument)):
+        tracer.annotate(command="unrecognized")
+        return "Unrecognized command. Please try again or text 'Main Menu' to see the menu options."
+    tracer.annotate(command=command)
+    return handler(session, incoming_message, argument)
+
+
+def command_learn(session, incoming_message, wop):
+    phone_number = session.user.data["phone_number"]
+    return run_limited_command(phone_number, incoming_message, handle_learn_request, phone_number, wop)
+
+
+def command_suggest(session, incoming_message, argument):
+    return run_limited_command(session.user.data["phone_number"], incoming_message, handle_suggest_request, session.user)
+
+
+def command_quiz(session, incoming_message, argument):
+    return run_limited_command(session.user.data["phone_number"], incoming_message, handle_quiz_request, session.user)
+
+
+def command_article(session, incoming_message, argument):
+    return run_limited_command(session.user.data["phone_number"], incoming_message, handle_article_request, session.user)
+
+
+# Main menu commands: lowercase command -> (handler, whether it takes the rest of the message)
+menu_commands = {
+    "main menu": (lambda session, incoming_message, argument: main_menu(), False),
+    "learn": (command_learn, True),
+    "suggest": (command_suggest, False),
+    "quiz": (command_quiz, False),
+    "article": (command_article, False),
+    "delete account": (lambda session, incoming_message, argument: delete_account(session.user.data["phone_number"]), False),
+}
+
+# Where each conversation state sends the next message
+state_handlers = {
+    ConversationState.ONBOARDING: handle_onboarding_message,
+    ConversationState.MENU: handle_menu_message,
+    ConversationState.QUIZ: handle_quiz_message,
+}
+
+
+def warm_backends():
+    """Build every backend client and open a connection to each, so the first messages don't pay for it."""
+    warmups = {
+        "supabase": lambda: get_supabase().table("users").select("phone_number").limit(1).execute(),
+        "openai": lambda: get_openai().Model.list(),
+        "twilio": lambda: get_twilio_client().api.v2010.accounts(account_sid).fetch(),
+    }
+    errors = {}
+    for name, warmup in warmups.items():
+        try:
+            with backend_limits[name]:
+                warmup()
+        except Exception as e:
+            logger.warning("Warm up error (%s): %s", name, e)
+            errors[name] = str(e)
+
+    # NumPy takes about as long to import as an SDK; the first Suggest would wait for it
+    load_numpy()
+
+    # Only Supabase is needed for every message; /ready retries the warm up until it answers
+    with backend_warmup_lock:
+        backend_warmup.update(running=False, ready="supabase" not in errors, errors=errors)
+
+
 """
 ROUTES
 """
@@ -621,39 +2898,116 @@ ROUTES
 def handle_sms():
     incoming_message = request.values.get('Body', '').strip()
     user_phone_number = request.values.get('From')
+    message_sid = request.values.get('MessageSid')
+    logger.debug("Received message %s", message_sid)
+
+    # Twilio retries webhooks it thinks failed; don't run the same message twice
+    if (message_sid and not seen_message_sids.add(message_sid)):
+        logger.info("Ignoring duplicate webhook for %s", message_sid)
+        return str(MessagingResponse())
+
+    # Each message is its own trace, named after its MessageSid
+    with tracer.span("webhook", trace_id=message_sid or os.urandom(8).hex(), async_webhooks=async_webhooks) as webhook_span:
+        # Acknowledge Twilio right away and send the reply from the worker pool
+        if (async_webhooks):
+            our_phone_number = request.values.get('To')
+            if (not webhook_queues.submit(user_phone_number, process_message_in_background, user_phone_number, our_phone_number, incoming_message, webhook_span)):
+                return respond("We're getting a lot of messages right now. Please try again in a minute.")
+            return str(MessagingResponse())
+
+        # A message that fails is answered with a 500, so let Twilio's retry through
+        try:
+            reply = process_message(user_phone_number, incoming_message)
+        except Exception:
+            if (message_sid):
+                seen_message_sids.discard(message_sid)
+            raise
+        with tracer.span("twiml"):
+            return respond(reply)
+
+@app.route("/vocab/import", methods=["POST"])
+def import_vocab_route():
+    """
+    Add words to a user's learned vocab from an uploaded CSV or Anki text export.
 
-    print(f"Received message from {user_phone_number}: {incoming_message}")
-
-    # If this is a new user, ask them some basic questions
-    info_quiz_stage = phone_number_has_completed_basic_info(user_phone_number)
-    if (info_quiz_stage != Basic_Info_Stage.COMPLETED.name):
-        return take_info_quiz(info_quiz_stage, user_phone_number, incoming_message)
-
-    # If the user is in quiz mode, check their answer
-    user = get_user(user_phone_number)
-    if (user.data["is_in_quiz_mode"]):
-        return handle_quiz_response(user_phone_number, incoming_message)
-    
-    if (incoming_message.lower() == "main menu"):
-        print("Should see Main Menu")
-        return main_menu()
-    elif (incoming_message.lower().startswith("learn ")):
-        print("Should see Learn")
-        return handle_learn_request(user_phone_number, incoming_message[6:])
-    elif (incoming_message.lower() == ("suggest")):
-        print("Should see Suggest")
-        return handle_suggest_request(user_phone_number)
-    elif (incoming_message.lower() == "quiz"):
-        print("Should see Quiz")
-        return handle_quiz_request(user_phone_number)
-    elif (incoming_message.lower() == "article"):
-        return handle_article_request(user_phone_number)
-    elif incoming_message.lower() == "delete account":
-        print("Should see Delete Account")
-        return delete_account(user_phone_number)
-    else:
-        print("Should see Unrecognized command")
-        return respond("Unrecognized command. Please try again or text 'Main Menu' to see the menu options.")
+    Send the file as the `file` form field (or as the request body) with the
+    user's `phone_number`, e.g. whatsapp:+15551234567. Requires VOCAB_API_TOKEN.
+    """
+    require_api_token()
+    phone_number = request.args.get("phone_number") or request.form.get("phone_number")
+    if not phone_number:
+        abort(400, "phone_number is required")
+    upload = request.files.get("file")
+    total, new, truncated = import_vocab(phone_number, read_import_words(upload.stream if upload else request.stream))
+    return jsonify({"words": total, "imported": new, "skipped": total - new, "truncated": truncated, "max_words": vocab_import_max_words})
+
+@app.route("/vocab/export", methods=["GET"])
+def export_vocab_route():
+    """Stream a user's learned words and review progress as CSV, one page of rows at a time. Requires VOCAB_API_TOKEN."""
+    require_api_token()
+    phone_number = request.args.get("phone_number")
+    if not phone_number:
+        abort(400, "phone_number is required")
+
+    def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["word", "ease", "interval_days", "repetitions", "due_at"])
+        after_id = 0
+        while True:
+            try:
+                page = get_learned_vocab_page(phone_number, after_id, vocab_export_page_size)
+            except Exception as e:
+                logger.error("Supabase fetch error (vocab export): %s", e)
+                return
+            for row in page:
+                writer.writerow([row["wop"], row["ease"], row["interval_days"], row["repetitions"], row["due_at"]])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            if len(page) < vocab_export_page_size:
+                return
+            after_id = page[-1]["id"]
+
+    return Response(stream_with_context(rows()), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=teleglot_vocab.csv"})
+
+def require_api_token():
+    """Reject the request unless it has 'Authorization: Bearer <VOCAB_API_TOKEN>'."""
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not vocab_api_token or not hmac.compare_digest(token.encode(), vocab_api_token.encode()):
+        abort(401)
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 503 until the backend clients are built and Supabase has answered."""
+    with backend_warmup_lock:
+        start_warmup = not backend_warmup["ready"] and not backend_warmup["running"]
+        if (start_warmup):
+            backend_warmup["running"] = True
+    if (start_warmup and not background_pool.submit(warm_backends)):
+        with backend_warmup_lock:
+            backend_warmup["running"] = False
+
+    with backend_warmup_lock:
+        return jsonify(backend_warmup), 200 if backend_warmup["ready"] else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "lexicon": lexicon.stats(),
+        "learn_card_cache": learn_card_cache.stats(),
+        "article_cache": article_cache.stats(),
+        "learn_batcher": learn_batcher.stats(),
+        "webhook_pool": webhook_queues.stats(),
+        "background_pool": background_pool.stats(),
+        "llm": llm_metrics.stats(),
+        "llm_circuit_breaker": llm_circuit_breaker.stats(),
+        "command_rate_limiter": command_rate_limiter.stats(),
+        "sessions": sessions.stats(),
+        "command_flights": command_flights.stats(),
+        "message_sids": seen_message_sids.stats(),
+    })
 
 # Start flask app
 if __name__ == "__main__":
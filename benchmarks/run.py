@@ -0,0 +1,222 @@
+"""
+Load test for the /whatsapp webhook, run against in-process backend stubs.
+
+    python benchmarks/run.py                    # run, then compare with benchmarks/baseline.json
+    python benchmarks/run.py --update-baseline  # run, then save the results as the new baseline
+
+Simulated users go through the onboarding, learn, suggest, quiz and article
+flows in order, `--concurrency` users at a time, through Flask's test client.
+Supabase, OpenAI and Twilio are replaced by the stubs in stubs.py, with
+`--llm-latency` and `--db-latency` seconds added to each call. For every flow
+we report throughput, p50/p95/p99 latency and Supabase and ChatGPT calls per
+message. A flow regresses when its throughput drops or its p95 latency rises
+by more than `--tolerance`, or when it makes more backend calls per message
+than the baseline. The script exits with status 1 when any flow regresses.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchmark_dir))
+
+# app.py reads its settings at import: use fake credentials, throwaway cache and
+# trace files, and no rate limits so the benchmark measures the app rather than its limits
+benchmark_tmp = tempfile.mkdtemp(prefix="teleglot-benchmark-")
+os.environ.update({
+    "SUPABASE_PROJECT_URL": "https://benchmark.supabase.co",
+    "SUPABASE_PUBLIC_ANON_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark",
+    "ACCOUNT_SID": "ACbenchmark",
+    "AUTHTOKEN": "benchmark",
+    "CHATGPT": "sk-benchmark",
+    "CACHE_PATH": os.path.join(benchmark_tmp, "cache.sqlite3"),
+    "TRACE_PATH": os.path.join(benchmark_tmp, "traces.jsonl"),
+    "LOG_LEVEL": "WARNING",
+    "ASYNC_WEBHOOKS": "false",
+    "USER_COMMAND_RATE_PER_MINUTE": "1000000000",
+    "USER_COMMAND_BURST": "1000000000",
+    "GLOBAL_COMMAND_RATE_PER_SECOND": "1000000000",
+    "GLOBAL_COMMAND_BURST": "1000000000",
+})
+
+import app as teleglot  # noqa: E402
+import stubs  # noqa: E402
+
+baseline_path = os.path.join(benchmark_dir, "baseline.json")
+
+flows = ("onboarding", "learn", "suggest", "quiz", "article")
+
+# Half of these are in data/lexicon.tsv, the rest need ChatGPT
+learn_words = [
+    "water", "house", "friend", "mountain", "kitchen", "library", "train", "garden", "weather", "music",
+    "lighthouse", "telescope", "volcano", "saxophone", "umbrella", "compass", "lantern", "harbor", "meadow", "violin",
+]
+cities = ["Boston", "Madrid", "Chicago", "Mexico City", "London"]
+levels = ["Beginner", "Intermediate", "Advanced"]
+interests = ["Sports, Music", "Art", "Cooking, Travel", "Technology", "Music"]
+
+
+def user_messages(flow, user, rng):
+    """The messages one simulated user sends during `flow`."""
+    if flow == "onboarding":
+        return ["Hi", f"User {user}", rng.choice(cities), str(rng.randint(18, 70)), rng.choice(levels), rng.choice(interests)]
+    if flow == "learn":
+        return [f"Learn {word}" for word in rng.sample(learn_words, 5)]
+    if flow == "suggest":
+        return ["Suggest"]
+    if flow == "quiz":
+        return ["Quiz", str(rng.randint(1, 4)), "Quiz", str(rng.randint(1, 4))]
+    return ["Article"]
+
+
+def percentile_ms(samples, pct):
+    return round(teleglot.percentile(samples, pct) * 1000, 2)
+
+
+def wait_for_background_jobs():
+    """Let quiz pool refills and other background work finish so their backend calls are counted."""
+    while True:
+        stats = teleglot.background_pool.stats()
+        if stats["queue_depth"] == 0 and stats["running"] == 0:
+            return
+        time.sleep(0.01)
+
+
+def run_flow(flow, users, concurrency, seed, backends):
+    """Send every user's messages for `flow`, `concurrency` users at a time, and summarise the run."""
+    supabase, openai, twilio = backends
+    message_sids = count()
+    latencies = []
+    db_round_trips = []
+
+    def run_user(user):
+        client = teleglot.app.test_client()
+        rng = random.Random(f"{seed}-{flow}-{user}")
+        for body in user_messages(flow, user, rng):
+            started_at = time.perf_counter()
+            response = client.post("/whatsapp", data={
+                "Body": body,
+                "From": f"whatsapp:+1555{user:07d}",
+                "To": "whatsapp:+14155238886",
+                "MessageSid": f"SM{flow}{next(message_sids)}",
+            })
+            latencies.append(time.perf_counter() - started_at)
+            db_round_trips.append(int(response.headers.get("X-DB-Round-Trips", 0)))
+            if response.status_code != 200:
+                raise RuntimeError(f"{flow}: {body!r} returned HTTP {response.status_code}")
+
+    db_calls, llm_calls = supabase.calls, openai.calls
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for result in [executor.submit(run_user, user) for user in range(users)]:
+            result.result()
+    elapsed = time.perf_counter() - started_at
+    wait_for_background_jobs()
+
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "db_calls_per_request": round(sum(db_round_trips) / requests, 3),
+        "db_calls_per_request_with_background": round((supabase.calls - db_calls) / requests, 3),
+        "llm_calls_per_request": round((openai.calls - llm_calls) / requests, 3),
+    }
+
+
+def run(config):
+    backends = stubs.install(teleglot, config["llm_latency"], config["db_latency"])
+    # Deployed workers import NumPy during the /ready warm up, before they get traffic
+    teleglot.load_numpy()
+    return {flow: run_flow(flow, config["users"], config["concurrency"], config["seed"], backends) for flow in flows}
+
+
+def compare(results, baseline, tolerance):
+    """Describe each way `results` is worse than `baseline`."""
+    regressions = []
+    for flow, result in results.items():
+        expected = baseline.get(flow)
+        if not expected:
+            continue
+        if result["throughput_rps"] < expected["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{flow}: throughput {result['throughput_rps']} req/s, baseline {expected['throughput_rps']}")
+        if result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{flow}: p95 latency {result['p95_ms']} ms, baseline {expected['p95_ms']}")
+        # Concurrent users in the same cache bucket can race to fill it, so call counts vary a little between runs
+        for metric in ("db_calls_per_request", "db_calls_per_request_with_background", "llm_calls_per_request"):
+            if result[metric] > expected[metric] * 1.1 + 0.01:
+                regressions.append(f"{flow}: {metric} {result[metric]}, baseline {expected[metric]}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'flow':<12}{'requests':>9}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db/req':>9}{'db+bg/req':>11}{'llm/req':>9}")
+    for flow, result in results.items():
+        print(f"{flow:<12}{result['requests']:>9}{result['throughput_rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['db_calls_per_request']:>9}{result['db_calls_per_request_with_background']:>11}"
+              f"{result['llm_calls_per_request']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="simulated users (default 100)")
+    parser.add_argument("--concurrency", type=int, default=16, help="users sending at the same time (default 16)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds added to each ChatGPT call (default 0.05)")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds added to each Supabase call (default 0.002)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed throughput or p95 change before flagging (default 0.5)")
+    parser.add_argument("--baseline", default=baseline_path)
+    parser.add_argument("--update-baseline", action="store_true", help="save these results as the new baseline")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    config = {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "llm_latency": args.llm_latency,
+        "db_latency": args.db_latency,
+        "seed": args.seed,
+    }
+    results = run(config)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "flows": results}, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "flows": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    if baseline["config"] != config:
+        print(f"\nWarning: baseline was recorded with {baseline['config']}, so latency comparisons may not be meaningful")
+
+    regressions = compare(results, baseline["flows"], args.tolerance)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Cold start benchmark for app.py.
+
+    python benchmarks/startup.py                    # run, then compare with benchmarks/startup_baseline.json
+    python benchmarks/startup.py --update-baseline  # run, then save the results as the new baseline
+
+Each run imports app.py in a fresh interpreter and serves one webhook
+request through Flask's test client with the backend stubs installed. We
+report the median import time and time to first reply, and which of the
+Supabase, OpenAI and Twilio SDKs were imported before the first request.
+A run regresses when a median grows by more than `--tolerance`, or when
+importing the app loads an SDK that used to be deferred. The script exits
+with status 1 when it regresses.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+baseline_path = os.path.join(benchmark_dir, "startup_baseline.json")
+
+# Imported on first use by app.py; loading any of them at import slows every cold start
+deferred_modules = ["openai", "supabase", "twilio.rest", "httpx", "requests", "numpy"]
+
+# Run in a fresh interpreter, so nothing is imported or cached yet
+probe = f"""
+import json, os, sys, tempfile, time
+started_at = time.perf_counter()
+sys.path.insert(0, {os.path.dirname(benchmark_dir)!r})
+sys.path.insert(0, {benchmark_dir!r})
+tmp = tempfile.mkdtemp(prefix="teleglot-startup-")
+os.environ.update({{
+    "SUPABASE_PROJECT_URL": "https://benchmark.supabase.co",
+    "SUPABASE_PUBLIC_ANON_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark",
+    "CACHE_PATH": os.path.join(tmp, "cache.sqlite3"),
+    "TRACE_PATH": os.path.join(tmp, "traces.jsonl"),
+    "LOG_LEVEL": "WARNING",
+}})
+import app
+imported_at = time.perf_counter()
+loaded = [module for module in {deferred_modules!r} if module in sys.modules]
+
+import stubs
+stubs.install(app)
+app.app.test_client().post("/whatsapp", data={{"Body": "Hi", "From": "whatsapp:+15550000001", "MessageSid": "SMstartup"}})
+replied_at = time.perf_counter()
+print(json.dumps({{"import_ms": (imported_at - started_at) * 1000, "first_reply_ms": (replied_at - started_at) * 1000, "loaded": loaded}}))
+"""
+
+
+def measure(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(sample["import_ms"] for sample in samples), 1),
+        "first_reply_ms": round(statistics.median(sample["first_reply_ms"] for sample in samples), 1),
+        "sdks_loaded_at_import": samples[-1]["loaded"],
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Describe each way `result` is worse than `baseline`."""
+    regressions = []
+    for metric in ("import_ms", "first_reply_ms"):
+        if result[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append(f"{metric} {result[metric]}, baseline {baseline[metric]}")
+    newly_loaded = sorted(set(result["sdks_loaded_at_import"]) - set(baseline["sdks_loaded_at_import"]))
+    if newly_loaded:
+        regressions.append(f"importing app.py now loads {', '.join(newly_loaded)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to start (default 7)")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed growth of a median before flagging (default 0.5)")
+    parser.add_argument("--baseline", default=baseline_path)
+    parser.add_argument("--update-baseline", action="store_true", help="save these results as the new baseline")
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(f"import app.py:    {result['import_ms']} ms (median of {args.runs})")
+    print(f"first reply:      {result['first_reply_ms']} ms")
+    print(f"SDKs at import:   {', '.join(result['sdks_loaded_at_import']) or 'none'}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+In-process stand-ins for Supabase, OpenAI and Twilio.
+
+They implement just enough of each client for app.py: the Supabase query
+builder calls it makes (against in-memory tables), ChatCompletion.create
+with a configurable latency, and messages.create. Every call is counted so
+the benchmark can report backend calls per message.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class StubResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class StubQuery:
+    """The subset of postgrest's query builder that app.py uses."""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.filters = []
+        self.payload = None
+        self.single = False
+        self.ordering = None
+        self.row_limit = None
+        self.row_range = None
+        self.count = None
+        self.on_conflict = []
+        self.ignore_duplicates = False
+
+    def select(self, columns="*", count=None):
+        self.operation = "select"
+        self.count = count
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.operation = "insert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict="", ignore_duplicates=False, **kwargs):
+        self.operation = "upsert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = [column for column in on_conflict.split(",") if column]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values, **kwargs):
+        self.operation = "update"
+        self.payload = values
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.ordering = (column, desc)
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def range(self, start, end):
+        self.row_range = (start, end)
+        return self
+
+    def maybe_single(self):
+        self.single = True
+        return self
+
+    def execute(self):
+        time.sleep(self.db.latency)
+        with self.db.lock:
+            self.db.calls += 1
+            return getattr(self, f"_{self.operation}")(self.db.tables.setdefault(self.table, []))
+
+    def _matching(self, rows):
+        return [row for row in rows if all(matches(row) for matches in self.filters)]
+
+    def _select(self, rows):
+        rows = self._matching(rows)
+        if self.ordering:
+            column, desc = self.ordering
+            rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        total = len(rows)
+        if self.row_range:
+            rows = rows[self.row_range[0]:self.row_range[1] + 1]
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+        rows = [dict(row) for row in rows]
+        if self.single:
+            return StubResponse(rows[0]) if rows else None
+        return StubResponse(rows, total if self.count else None)
+
+    def _insert(self, rows):
+        inserted = []
+        for values in self.payload:
+            row = {**self.db.defaults.get(self.table, {}), **values}
+            if self.table == "learned_vocab":
+                row.setdefault("due_at", datetime.now(timezone.utc).isoformat())
+            if self.on_conflict:
+                existing = [r for r in rows if all(r.get(column) == row.get(column) for column in self.on_conflict)]
+                if existing:
+                    if not self.ignore_duplicates:
+                        existing[0].update(values)
+                        inserted.append(dict(existing[0]))
+                    continue
+            self.db.next_id += 1
+            row.setdefault("id", self.db.next_id)
+            rows.append(row)
+            inserted.append(dict(row))
+        return StubResponse(inserted)
+
+    _upsert = _insert
+
+    def _update(self, rows):
+        updated = []
+        for row in self._matching(rows):
+            row.update(self.payload)
+            updated.append(dict(row))
+        return StubResponse(updated)
+
+    def _delete(self, rows):
+        deleted = self._matching(rows)
+        self.db.tables[self.table] = [row for row in rows if row not in deleted]
+        return StubResponse([dict(row) for row in deleted])
+
+
+class StubRPC:
+    def __init__(self, db, function, params):
+        self.db = db
+        self.function = function
+        self.params = params
+
+    def execute(self):
+        time.sleep(self.db.latency)
+        with self.db.lock:
+            self.db.calls += 1
+            if self.function == "delete_account":
+                for table, rows in self.db.tables.items():
+                    self.db.tables[table] = [row for row in rows if row.get("phone_number") != self.params["p_phone_number"]]
+            return StubResponse(None)
+
+
+class StubSupabase:
+    """In-memory Supabase with the column defaults of the tables in migrations/."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.tables = {}
+        self.calls = 0
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.defaults = {
+            "users": {
+                "name": None, "location": None, "age": None, "proficiency": None, "interests": None,
+                "info_stage": None, "quiz_answer": None, "quiz_wop": None, "is_in_quiz_mode": False,
+            },
+            "learned_vocab": {"ease": 2.5, "interval_days": 0, "repetitions": 0},
+        }
+
+    def table(self, name):
+        return StubQuery(self, name)
+
+    def rpc(self, function, params=None):
+        return StubRPC(self, function, params or {})
+
+
+class StubCompletion(dict):
+    def __init__(self, content):
+        super().__init__(usage={"prompt_tokens": 50, "completion_tokens": len(content) // 4, "total_tokens": 50 + len(content) // 4})
+        self.usage = self["usage"]
+        self.choices = [type("Choice", (), {"message": type("Message", (), {"content": content})()})()]
+
+
+class StubOpenAI:
+    """
+    Stands in for the openai module: ChatCompletion.create answers each
+    prompt app.py sends with a plausible reply after `latency` seconds.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.ChatCompletion = self
+
+    @property
+    def error(self):
+        # app.py only looks at the error classes when a call fails
+        import openai
+        return openai.error
+
+    def create(self, messages, **kwargs):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+        return StubCompletion(self.reply(messages[-1]["content"]))
+
+    def reply(self, prompt):
+        word = prompt.split("'")[1] if prompt.count("'") >= 2 else "word"
+        if "whose keys are exactly these" in prompt:
+            words = json.loads(prompt.split("phrases: ", 1)[1].split("]. ", 1)[0] + "]")
+            return json.dumps({word: f"Translation: {word}-es\nPronunciation: {word}-AH\nSample sentence: Aprendo {word}-es. (I learn {word}.)" for word in words})
+        if prompt.startswith("Reply with only a JSON object"):
+            return json.dumps({"translation": f"{word}-es", "distractors": [f"{word}a", f"{word}b", f"{word}c"]})
+        if "translation, pronunciation, and sample sentence" in prompt:
+            return "Translation: palabra\nPronunciation: pah-LAH-brah\nSample sentence: Aprendo una palabra nueva. (I learn a new word.)"
+        if "list of" in prompt and "English words" in prompt:
+            return "compass, lantern, harbor, meadow, violin, pepper"
+        if "news article" in prompt:
+            return "Spanish Article:\n\n" + "Hoy hace sol en la ciudad. " * 20 + "\n\nEnglish Translation:\n\n" + "Today it is sunny in the city. " * 20
+        if "one English word" in prompt:
+            return "lantern"
+        if "could be confused with" in prompt:
+            return f"{word}a, {word}b, {word}c"
+        return f"{word}-es"
+
+
+class StubTwilio:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.messages = self
+
+    def create(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+
+
+def install(app_module, llm_latency=0.0, db_latency=0.0):
+    """Point app.py at fresh stubs and return (supabase, openai, twilio) stubs."""
+    supabase = StubSupabase(db_latency)
+    openai = StubOpenAI(llm_latency)
+    twilio = StubTwilio()
+    app_module.backend_clients.update(supabase=supabase, openai=openai, twilio=twilio)
+    return supabase, openai, twilio
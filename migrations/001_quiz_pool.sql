@@ -0,0 +1,13 @@
+-- Quizzes generated ahead of time so handle_quiz_request can skip ChatGPT.
+-- Rows are popped oldest first, so (phone_number, id) is the only index needed.
+create table if not exists quiz_pool (
+    id bigint generated by default as identity primary key,
+    phone_number text not null,
+    wop text not null,
+    spanish text not null,
+    options jsonb not null,
+    answer_index smallint not null check (answer_index between 1 and 4),
+    created_at timestamptz not null default now()
+);
+
+create index if not exists quiz_pool_phone_number_id on quiz_pool (phone_number, id);
@@ -0,0 +1,13 @@
+-- Deletes a user and everything that belongs to them in one transaction, so
+-- delete_account() is a single round trip and can't leave orphaned rows behind.
+create or replace function delete_account(p_phone_number text)
+returns void
+language plpgsql
+as $$
+begin
+    delete from learned_vocab where phone_number = p_phone_number;
+    delete from suggested_vocab where phone_number = p_phone_number;
+    delete from quiz_pool where phone_number = p_phone_number;
+    delete from users where phone_number = p_phone_number;
+end;
+$$;
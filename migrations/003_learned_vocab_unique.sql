@@ -0,0 +1,16 @@
+-- Store learned words normalized (case, whitespace, accents, trailing
+-- punctuation, matching normalize_vocab in app.py) and allow each word once
+-- per user, so insert_vocab can be a single upsert.
+create extension if not exists unaccent;
+
+update learned_vocab
+set wop = trim(both '.!?,;: ' from regexp_replace(lower(unaccent(wop)), '\s+', ' ', 'g'));
+
+-- Keep the oldest copy of each duplicate
+delete from learned_vocab a
+using learned_vocab b
+where a.phone_number = b.phone_number
+  and a.wop = b.wop
+  and a.id > b.id;
+
+create unique index if not exists learned_vocab_phone_number_wop on learned_vocab (phone_number, wop);
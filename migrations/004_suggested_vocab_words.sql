@@ -0,0 +1,23 @@
+-- Suggestions used to be stored as ChatGPT's raw comma separated reply.
+-- Split them into one normalized word per row (matching normalize_vocab in
+-- app.py) and allow each word once per user.
+create extension if not exists unaccent;
+
+begin;
+
+create temporary table split_suggestions on commit drop as
+select distinct
+    phone_number,
+    trim(both '.!?,;: ' from regexp_replace(lower(unaccent(word)), '\s+', ' ', 'g')) as suggestion
+from suggested_vocab, regexp_split_to_table(suggestion, '[,\n]') as word;
+
+delete from suggested_vocab;
+
+insert into suggested_vocab (phone_number, suggestion)
+select phone_number, suggestion
+from split_suggestions
+where suggestion <> '';
+
+commit;
+
+create unique index if not exists suggested_vocab_phone_number_suggestion on suggested_vocab (phone_number, suggestion);
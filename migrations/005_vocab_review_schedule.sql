@@ -0,0 +1,12 @@
+-- SM-2 review schedule for each learned word. The next quiz word is the
+-- user's earliest due_at, read straight off the index.
+alter table learned_vocab
+    add column if not exists ease real not null default 2.5,
+    add column if not exists interval_days integer not null default 0,
+    add column if not exists repetitions integer not null default 0,
+    add column if not exists due_at timestamptz not null default now();
+
+create index if not exists learned_vocab_phone_number_due_at on learned_vocab (phone_number, due_at);
+
+-- The word the user is currently being quizzed on, so the answer can update its schedule
+alter table users add column if not exists quiz_wop text;
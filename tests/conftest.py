@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# app.py reads its settings at import: use fake credentials and throwaway cache and trace files
+test_tmp = tempfile.mkdtemp(prefix="teleglot-tests-")
+os.environ.update({
+    "SUPABASE_PROJECT_URL": "https://tests.supabase.co",
+    "SUPABASE_PUBLIC_ANON_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.tests",
+    "CACHE_PATH": os.path.join(test_tmp, "cache.sqlite3"),
+    "TRACE_PATH": os.path.join(test_tmp, "traces.jsonl"),
+    "LOG_LEVEL": "WARNING",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import app
+
+
+class CountingLimit:
+    def __init__(self):
+        self.tokens = 0
+
+    def acquire(self):
+        self.tokens += 1
+
+
+def test_broadcast_takes_a_token_for_each_part_sent(monkeypatch):
+    parts = []
+    monkeypatch.setattr(app, "send_message", lambda to_number, from_number, body: parts.append(body))
+    limit = CountingLimit()
+    article = "\n\n".join(["Hoy hace sol en la ciudad. " * 20] * 8)
+
+    assert app.send_broadcast_message(limit, "whatsapp:+15550000001", "whatsapp:+14155238886", article)
+    assert len(parts) > 1
+    assert all(len(part) <= app.whatsapp_message_limit for part in parts)
+    assert limit.tokens == len(parts)
+
+
+def test_short_broadcast_takes_one_token(monkeypatch):
+    monkeypatch.setattr(app, "send_message", lambda to_number, from_number, body: None)
+    limit = CountingLimit()
+    assert app.send_broadcast_message(limit, "whatsapp:+15550000001", "whatsapp:+14155238886", "Word of the day: faro")
+    assert limit.tokens == 1
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import openai
+import pytest
+
+import app
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = app.CircuitBreaker(failure_threshold=1000, reset_seconds=30)
+    monkeypatch.setattr(app, "llm_circuit_breaker", breaker)
+    return breaker
+
+
+class FakeOpenAI:
+    """Stands in for the openai module: ChatCompletion.create runs `create`, errors are the real classes."""
+
+    error = openai.error
+
+    def __init__(self, create):
+        self.ChatCompletion = self
+        self.create = create
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = app.CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 2}
+
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.stats()["state"] == "open"
+
+
+def test_breaker_lets_one_trial_through_when_half_open(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, "monotonic", lambda: now[0])
+    breaker = app.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] += 30
+    assert breaker.stats()["state"] == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial re-opens it for another reset period
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] += 30
+    assert breaker.allow()
+
+    # A successful trial closes it
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0}
+
+
+def test_retries_stop_at_the_deadline(monkeypatch, breaker):
+    monkeypatch.setitem(app.llm_deadline_seconds, "learn", 0.3)
+    monkeypatch.setattr(app, "llm_max_retries", 1000)
+    monkeypatch.setattr(app, "llm_retry_base_seconds", 0.02)
+    monkeypatch.setitem(app.backend_clients, "openai", FakeOpenAI(None))
+    attempts = []
+
+    def attempt(timeout):
+        attempts.append(timeout)
+        raise openai.error.Timeout("slow")
+
+    started_at = time.monotonic()
+    with pytest.raises((openai.error.Timeout, app.LLMUnavailableError)):
+        app.call_llm("learn", attempt)
+    assert time.monotonic() - started_at < 0.4
+    assert len(attempts) > 1
+    # Each attempt only gets what is left of the deadline
+    assert all(later <= earlier for earlier, later in zip(attempts, attempts[1:]))
+    assert attempts[0] <= 0.3
+
+
+def test_rejected_requests_are_not_retried(monkeypatch, breaker):
+    monkeypatch.setitem(app.backend_clients, "openai", FakeOpenAI(None))
+    attempts = []
+
+    def attempt(timeout):
+        attempts.append(timeout)
+        raise openai.error.InvalidRequestError("bad prompt", None)
+
+    with pytest.raises(openai.error.InvalidRequestError):
+        app.call_llm("learn", attempt)
+    assert len(attempts) == 1
+    assert breaker.stats()["consecutive_failures"] == 0
+
+
+def test_open_breaker_fails_fast(monkeypatch):
+    breaker = app.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    monkeypatch.setattr(app, "llm_circuit_breaker", breaker)
+    with pytest.raises(app.LLMUnavailableError):
+        app.call_llm("learn", lambda timeout: pytest.fail("called ChatGPT with the breaker open"))
+
+
+def test_hedged_request_returns_the_first_to_succeed(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def create(request_timeout, **kwargs):
+        with lock:
+            calls.append(request_timeout)
+            first = len(calls) == 1
+        if first:
+            time.sleep(1)
+            return "slow"
+        return "fast"
+
+    monkeypatch.setitem(app.backend_clients, "openai", FakeOpenAI(create))
+    monkeypatch.setattr(app, "llm_hedge", True)
+    monkeypatch.setattr(app, "llm_hedge_min_seconds", 0.05)
+
+    started_at = time.monotonic()
+    assert app.create_completion("hedge_test", 5, {}) == "fast"
+    assert time.monotonic() - started_at < 0.5
+    assert len(calls) == 2
+    assert app.llm_metrics.stats()["hedge_test"]["hedges"] == 1
+
+
+def test_fast_request_is_not_hedged(monkeypatch):
+    calls = []
+    monkeypatch.setitem(app.backend_clients, "openai", FakeOpenAI(lambda request_timeout, **kwargs: calls.append(request_timeout) or "only"))
+    monkeypatch.setattr(app, "llm_hedge", True)
+    monkeypatch.setattr(app, "llm_hedge_min_seconds", 0.2)
+    assert app.create_completion("unhedged_test", 5, {}) == "only"
+    time.sleep(0.3)
+    assert len(calls) == 1
+
+
+def test_deadline_can_be_set_per_call(monkeypatch, breaker):
+    monkeypatch.setitem(app.llm_deadline_seconds, "learn", 0.1)
+    assert app.call_llm("learn", lambda timeout: timeout, deadline_seconds=5) > 4
+
+
+def test_learn_batch_deadline_grows_with_its_size(monkeypatch):
+    monkeypatch.setitem(app.llm_deadline_seconds, "learn", 10)
+    monkeypatch.setattr(app, "learn_batch_seconds_per_word", 2)
+    assert app.learn_batch_deadline_seconds(1) == 10
+    assert app.learn_batch_deadline_seconds(10) == 28
+
+
+@pytest.fixture
+def failing_learn_batcher(monkeypatch):
+    def fail(words):
+        raise app.LLMUnavailableError("ChatGPT deadline exceeded for learn")
+
+    monkeypatch.setattr(app, "learn_batcher", app.RequestBatcher(fail, 0.05, 10))
+    monkeypatch.setattr(app, "prompt_chatgpt_for_translation_pronunciation_and_sample_sentence", lambda word: f"Card for {word}")
+
+
+def test_learn_batch_of_one_falls_back_on_any_error(failing_learn_batcher):
+    assert app.batched_learn_card("harbor") == "Card for harbor"
+
+
+def test_learn_batch_error_reaches_every_word_in_a_larger_batch(failing_learn_batcher):
+    other = app.learn_batcher.submit("meadow")
+    with pytest.raises(app.LLMUnavailableError):
+        app.batched_learn_card("harbor")
+    assert other.batch_size == 2
@@ -0,0 +1,51 @@
+import pytest
+
+import app
+
+
+class Reply:
+    def __init__(self, content):
+        self.choices = [type("Choice", (), {"message": type("Message", (), {"content": content})})]
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Replace the ChatGPT gateway with a list of replies (or exceptions), returning the commands it was called with."""
+    commands = []
+    replies = []
+
+    def chat_completion(command, **kwargs):
+        commands.append(command)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return Reply(reply)
+
+    monkeypatch.setattr(app, "chat_completion", chat_completion)
+    return commands, replies
+
+
+def test_unparseable_quiz_reply_falls_back_to_separate_prompts(prompts):
+    commands, replies = prompts
+    replies.extend(["not json", "el faro"])
+    translation, distractors = app.generate_quiz("lighthouse")
+    assert translation == "el faro"
+    assert len(distractors) == 3 and "lighthouse" not in distractors
+    assert commands == ["quiz", "quiz"]
+
+
+@pytest.mark.parametrize("error", [app.LLMUnavailableError("circuit open"), TimeoutError("deadline")])
+def test_gateway_errors_are_not_retried_as_separate_prompts(prompts, error):
+    commands, replies = prompts
+    replies.append(error)
+    with pytest.raises(type(error)):
+        app.generate_quiz("lighthouse")
+    assert commands == ["quiz"]
+
+
+@pytest.mark.parametrize("word, singular", [("apples", "apple"), ("dogs", "dog"), ("houses", "house"), ("apple", "apple")])
+def test_lexicon_quiz_distractors_exclude_the_word_and_its_singular(word, singular):
+    translation, distractors = app.generate_quiz(word)
+    assert translation == app.lexicon.lookup(singular)["spanish"]
+    assert len(distractors) == 3
+    assert word not in distractors and singular not in distractors
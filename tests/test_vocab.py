@@ -0,0 +1,142 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("word, lemma", [
+    ("run", "run"),
+    ("running", "run"),
+    ("runs", "run"),
+    ("ran", "run"),
+    ("to run", "run"),
+    ("making", "make"),
+    ("baked", "bake"),
+    ("hopping", "hop"),
+    ("hoping", "hope"),
+    ("studied", "study"),
+    ("played", "play"),
+    ("dancing", "dance"),
+    ("seeing", "see"),
+    ("agreed", "agree"),
+    ("travelling", "travel"),
+    ("calling", "call"),
+    ("cities", "city"),
+    ("churches", "church"),
+    ("the beach", "beach"),
+    ("ice creams", "ice cream"),
+])
+def test_lemmatize(word, lemma):
+    assert app.lemmatize(word) == lemma
+
+
+@pytest.mark.parametrize("word", [
+    "better", "best", "left", "saw", "found", "drunk", "felt", "thought",
+    "interesting", "boring", "during", "evening", "morning", "building", "thing", "need", "news",
+])
+def test_lemmatize_leaves_words_that_are_not_inflections(word):
+    assert app.lemmatize(word) == word
+
+
+@pytest.mark.parametrize("word, singular", [
+    ("waters", "water"),
+    ("houses", "house"),
+    ("buses", "bus"),
+    ("boxes", "box"),
+    ("classes", "class"),
+    ("children", "child"),
+    ("ice creams", "ice cream"),
+    ("news", "news"),
+    ("goods", "goods"),
+    ("series", "series"),
+    ("bus", "bus"),
+    ("physics", "physics"),
+    ("yours", "yours"),
+    ("besides", "besides"),
+    ("lens", "lens"),
+    ("canvas", "canvas"),
+])
+def test_singularize(word, singular):
+    assert app.singularize(word) == singular
+
+
+@pytest.mark.parametrize("word", ["news", "goods"])
+def test_lexicon_does_not_strip_s_from_non_plurals(word):
+    assert app.lexicon.lookup(word) is None
+
+
+@pytest.mark.parametrize("known, word", [
+    ("run", "running"),
+    ("run", "to run"),
+    ("colour", "color"),
+    ("favourite", "favorite"),
+    ("centre", "center"),
+    ("organise", "organize"),
+    ("traveled", "travelling"),
+    ("ice-cream", "ice cream"),
+    ("accommodation", "accomodation"),
+])
+def test_vocab_index_matches_forms_and_spellings(known, word):
+    index = app.VocabIndex(app.vocab_duplicate_similarity)
+    index.add(known)
+    assert index.match(word) == known
+
+
+@pytest.mark.parametrize("known, word", [
+    ("friend", "friendship"),
+    ("compute", "computer"),
+    ("understand", "misunderstand"),
+    ("relation", "relationship"),
+    ("information", "informative"),
+    ("desert", "dessert"),
+    ("apple", "apple pie"),
+    ("train", "rain"),
+    ("good", "better"),
+    ("leave", "left"),
+    ("interest", "interesting"),
+    ("for", "four"),
+])
+def test_vocab_index_keeps_different_words_apart(known, word):
+    index = app.VocabIndex(app.vocab_duplicate_similarity)
+    index.add(known)
+    assert index.match(word) is None
+
+
+@pytest.fixture
+def backends():
+    import os
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+    import stubs
+    return stubs.install(app)
+
+
+@pytest.mark.parametrize("word, other", [("better", "good"), ("drunk", "drink"), ("left", "leave"), ("interesting", "interest")])
+def test_learn_does_not_reuse_another_words_card(backends, word, other):
+    app.learn_card_cache.set(other, f"Card for {other}")
+    reply = app.handle_learn_request("whatsapp:+15550000001", word)
+    assert f"Card for {other}" not in reply
+
+
+@pytest.mark.parametrize("word, other", [
+    ("yours", "your"), ("hers", "her"), ("ours", "our"), ("besides", "beside"),
+    ("sometimes", "sometime"), ("lens", "len"), ("canvas", "canva"), ("kayaks", "kayak"),
+])
+def test_learn_does_not_reuse_a_cached_card_for_a_word_ending_in_s(backends, word, other):
+    app.learn_card_cache.set(other, f"Card for {other}")
+    reply = app.handle_learn_request("whatsapp:+15550000001", word)
+    assert f"Card for {other}" not in reply
+
+
+def test_bulk_learn_prompts_for_no_cards(backends, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(app.background_pool, "submit", lambda fn, *args: scheduled.append(fn) or True)
+    reply = app.handle_bulk_learn_request("whatsapp:+15550000002", ["harbor", "lantern", "meadow"])
+    assert reply.startswith("Added 3 words")
+    assert scheduled == []
+    assert backends[1].calls == 0
+
+
+def test_import_reports_when_the_word_limit_cut_it_short(backends, monkeypatch):
+    monkeypatch.setattr(app, "vocab_import_max_words", 3)
+    assert app.import_vocab("whatsapp:+15550000003", ["oak", "elm", "ash"]) == (3, 3, False)
+    assert app.import_vocab("whatsapp:+15550000004", ["oak", "elm", "ash", "yew"]) == (3, 3, True)
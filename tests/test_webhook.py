@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+import app
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import stubs  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    stubs.install(app)
+    return app.app.test_client()
+
+
+def test_failed_message_is_processed_again_on_retry(client, monkeypatch):
+    replies = [RuntimeError("Supabase is down"), "Hello again"]
+
+    def process_message(phone_number, incoming_message):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(app, "process_message", process_message)
+    message = {"Body": "Hi", "From": "whatsapp:+15550009999", "MessageSid": "SMretry"}
+    assert client.post("/whatsapp", data=message).status_code == 500
+    response = client.post("/whatsapp", data=message)
+    assert response.status_code == 200
+    assert "Hello again" in response.get_data(as_text=True)
+
+
+def test_duplicate_message_is_dropped(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, "process_message", lambda phone_number, incoming_message: calls.append(incoming_message) or "Hi")
+    message = {"Body": "Hi", "From": "whatsapp:+15550009998", "MessageSid": "SMduplicate"}
+    client.post("/whatsapp", data=message)
+    client.post("/whatsapp", data=message)
+    assert calls == ["Hi"]
+
+
+def test_onboarding_across_two_workers_saves_each_answer(client, monkeypatch):
+    # Each worker process has its own SessionStore; alternate between two
+    workers = [app.SessionStore(app.session_store_size, app.session_ttl_seconds) for _ in range(2)]
+    phone_number = "whatsapp:+15550009997"
+    replies = []
+    for turn, body in enumerate(["Hi", "Ann Lee", "Boston", "30"]):
+        monkeypatch.setattr(app, "sessions", workers[turn % 2])
+        response = client.post("/whatsapp", data={"Body": body, "From": phone_number, "MessageSid": f"SMworkers{turn}"})
+        replies.append(response.get_data(as_text=True))
+
+    assert "Hi Ann Lee!" in replies[1]
+    user = app.get_user(phone_number).data
+    assert (user["name"], user["location"], user["age"]) == ("Ann Lee", "Boston", 30)
@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+
+def test_single_flight_shares_one_call():
+    flights = app.SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flights.do, "key", slow, 21)
+        started.wait(5)
+        followers = [executor.submit(flights.do, "key", slow, 21) for _ in range(3)]
+        time.sleep(0.05)
+        release.set()
+        assert [future.result() for future in [leader, *followers]] == [42] * 4
+    assert calls == [21]
+    assert flights.stats() == {"in_flight": 0, "coalesced": 3}
+
+
+def test_single_flight_shares_errors():
+    flights = app.SingleFlight()
+
+    def fail():
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        flights.do("key", fail)
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_batcher_sends_keys_from_one_window_together():
+    batches = []
+    batcher = app.RequestBatcher(lambda keys: batches.append(sorted(keys)) or {key: key.upper() for key in keys if key != "missing"}, 0.05, 10)
+
+    futures = [batcher.submit(key) for key in ("a", "b", "a", "missing")]
+    assert futures[0] is futures[2]
+    assert [future.result(5) for future in futures[:3]] == ["A", "B", "A"]
+    with pytest.raises(KeyError):
+        futures[3].result(5)
+    assert batches == [["a", "b", "missing"]]
+    assert batcher.stats()["coalesced"] == 1
+
+
+def test_batcher_sends_a_full_batch_without_waiting():
+    batches = []
+    batcher = app.RequestBatcher(lambda keys: batches.append(keys) or {key: key for key in keys}, 60, 2)
+    first = batcher.submit("a")
+    second = batcher.submit("b")
+    assert first.result(1) == "a" and second.result(1) == "b"
+    assert len(batches) == 1
+
+
+def test_batcher_passes_errors_to_every_caller():
+    def fail(keys):
+        raise TimeoutError("slow")
+
+    batcher = app.RequestBatcher(fail, 0.01, 10)
+    futures = [batcher.submit(key) for key in ("a", "b")]
+    for future in futures:
+        with pytest.raises(TimeoutError):
+            future.result(5)
+
+
+def test_serial_queue_keeps_each_keys_order():
+    pool = app.BoundedWorkerPool(8, 1000)
+    queues = app.KeyedSerialQueue(pool, 1000)
+    seen = {key: [] for key in "abcd"}
+    running = {key: 0 for key in "abcd"}
+    overlaps = []
+    rng = random.Random(1)
+
+    def job(key, index):
+        running[key] += 1
+        if running[key] > 1:
+            overlaps.append(key)
+        time.sleep(rng.random() / 500)
+        seen[key].append(index)
+        running[key] -= 1
+
+    for index in range(50):
+        for key in "abcd":
+            assert queues.submit(key, job, key, index)
+    deadline = time.monotonic() + 10
+    while queues.stats()["completed"] < 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert all(seen[key] == list(range(50)) for key in "abcd")
+    assert overlaps == []
+    stats = queues.stats()
+    assert stats["queue_depth"] == 0 and stats["active_keys"] == 0 and stats["failed"] == 0
+
+
+def test_serial_queue_rejects_past_the_backlog():
+    pool = app.BoundedWorkerPool(1, 10)
+    queues = app.KeyedSerialQueue(pool, 2)
+    release = threading.Event()
+    assert queues.submit("a", release.wait, 5)
+    time.sleep(0.05)
+    assert queues.submit("a", lambda: None)
+    assert queues.submit("a", lambda: None)
+    assert not queues.submit("a", lambda: None)
+    assert queues.stats()["queue_depth"] == 2 and queues.stats()["rejected"] == 1
+    release.set()